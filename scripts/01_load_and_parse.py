@@ -5,63 +5,69 @@ from pathlib import Path
 
 import pandas as pd
 
-
-COLS = [
-    "internal_id",
-    "issue_key",
-    "project",
-    "created_ts",
-    "updated_ts",
-    "issue_type",
-    "status",
-    "priority",
-    "summary",
-    "description",
-]
+from jira_export import COLS, DEFAULT_CHUNKSIZE, DISTINCT_MODES, SchemaReport, iter_export_chunks
+from stage_metrics import count_rows, instrument, phase, timed
+from table_io import TableWriter
 
 
+@instrument
 def main():
     ap = argparse.ArgumentParser(description="Load and parse Airflow Jira export (Paper 2).")
     ap.add_argument("--in", dest="in_csv", required=True, help="Path to airflow_working.csv")
     ap.add_argument("--out_dir", required=True, help="Directory to write intermediate outputs")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per streamed chunk")
+    ap.add_argument("--engine", default="c", choices=["c", "python"], help="CSV parser (python = slow fallback)")
+    ap.add_argument("--out_table", default=None,
+                    help="Optional .parquet/.arrow copy of the parsed export so 02 does not re-parse the CSV")
+    ap.add_argument("--distinct", default="exact", choices=list(DISTINCT_MODES),
+                    help="issue_key distinct count: exact (64-bit hash set) or hll (fixed-memory estimate)")
+    ap.add_argument("--sketch_out", default=None,
+                    help="Optional .npz of the report counters, mergeable with other partitions' (SchemaReport.load)")
     args = ap.parse_args()
 
     in_csv = Path(args.in_csv)
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # Use python engine because the export includes messy quotes/newlines.
-    df = pd.read_csv(
-        in_csv,
-        names=COLS,
-        header=None,
-        dtype=str,
-        engine="python",
-    )
+    # Stream the export in chunks; the export includes messy quotes/newlines inside quoted fields.
+    schema = SchemaReport(args.distinct)
+    preview_cols = ["issue_key", "project", "created_ts", "updated_ts", "issue_type", "status", "priority", "summary"]
+    preview_parts = []
+    preview_rows = 0
+    table_out = TableWriter(args.out_table, columns=COLS) if args.out_table else None
+    for chunk in timed(iter_export_chunks(in_csv, chunksize=args.chunksize, engine=args.engine), "read"):
+        count_rows(rows_in=len(chunk))
+        with phase("compute"):
+            schema.update(chunk)
+        if table_out is not None:
+            with phase("write"):
+                table_out.write(chunk)
+        if preview_rows < 50:
+            preview_parts.append(chunk[preview_cols].head(50 - preview_rows))
+            preview_rows += len(preview_parts[-1])
+
+    if table_out is not None:
+        table_out.close()
 
     # Basic schema report (no filtering)
-    report = {
-        "rows": int(len(df)),
-        "columns": list(df.columns),
-        "missing_per_column": {c: int(df[c].isna().sum()) for c in df.columns},
-        "issue_type_counts_top10": df["issue_type"].value_counts().head(10).to_dict(),
-        "priority_counts": df["priority"].value_counts().to_dict(),
-        "status_counts_top10": df["status"].value_counts().head(10).to_dict(),
-        "project_counts": df["project"].value_counts().to_dict(),
-        "unique_issue_keys": int(df["issue_key"].nunique()),
-        "duplicate_issue_keys": int(len(df) - df["issue_key"].nunique()),
-    }
+    report = schema.to_dict()
 
-    (out_dir / "01_schema_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+    with phase("write"):
+        (out_dir / "01_schema_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        if args.sketch_out:
+            schema.save(args.sketch_out)
 
-    # Small preview for sanity
-    preview_cols = ["issue_key", "project", "created_ts", "updated_ts", "issue_type", "status", "priority", "summary"]
-    df[preview_cols].head(50).to_csv(out_dir / "01_preview_sample.csv", index=False)
+        # Small preview for sanity
+        pd.concat(preview_parts, ignore_index=True).to_csv(out_dir / "01_preview_sample.csv", index=False)
 
     print("OK")
-    print(f"Rows loaded: {len(df)}")
+    print(f"Rows loaded: {report['rows']}")
     print(f"Schema report: {out_dir/'01_schema_report.json'}")
     print(f"Preview sample: {out_dir/'01_preview_sample.csv'}")
+    if table_out is not None:
+        print(f"Parsed table: {args.out_table}")
+    if args.sketch_out:
+        print(f"Report sketch: {args.sketch_out}")
 
 
 if __name__ == "__main__":
@@ -1,28 +1,94 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import json
 from pathlib import Path
 import pandas as pd
 
-COLS = [
-    "internal_id",
-    "issue_key",
-    "project",
-    "created_ts",
-    "updated_ts",
-    "issue_type",
-    "status",
-    "priority",
-    "summary",
-    "description",
-]
+from jira_export import COLS, DEFAULT_CHUNKSIZE, iter_export_chunks
+from stage_metrics import count_rows, instrument, phase, timed
+from table_io import TableWriter
+from text_store import TEXT_REF, TextStoreWriter
 
+def build_text(df, with_hash=False):
+    # LOCKED: text comes from summary only (it contains embedded description content in this export)
+    # Regex-free form of .str.replace(r"\s+", " ").str.strip(): str.split() splits on exactly the
+    # characters Python's re treats as \s, so " ".join(v.split()) is the same string. text_len (and
+    # optionally a hash) is computed in the same pass; missing summaries stay missing.
+    texts, lens, hashes = [], [], []
+    for v in df["summary"].astype(str):
+        if isinstance(v, str):
+            t = " ".join(v.split())
+            texts.append(t)
+            lens.append(len(t))
+            if with_hash:
+                # blake2b-16 of the normalized text: equal texts share a key for later dedup/caching
+                hashes.append(hashlib.blake2b(t.encode("utf-8"), digest_size=16).hexdigest())
+        else:
+            texts.append(v)
+            lens.append(None)
+            if with_hash:
+                hashes.append(None)
+    df["text"] = pd.Series(texts, index=df.index)
+    # Nullable int so the CSV formatting does not depend on which chunk holds a missing summary
+    df["text_len"] = pd.array(lens, dtype="Int64")
+    if with_hash:
+        df["text_hash"] = pd.Series(hashes, index=df.index, dtype=object)
+    return df
+
+class TextPass:
+    """02 over a stream of export chunks: build text, apply min_len, keep what the report needs.
+
+    Only text_len (one int per row) and the 5 shortest rows are retained for the report.
+    """
+
+    EXAMPLE_COLS = ["issue_key", "priority", "issue_type", "status", "text_len", "text"]
+
+    def __init__(self, min_len, with_hash=False):
+        self.min_len = min_len
+        self.with_hash = with_hash
+        self.before = self.after = self.removed = 0
+        self.text_lens = []
+        self.shortest = None
+
+    def process(self, df):
+        """Kept rows of one chunk (text, text_len and, with_hash, text_hash added)."""
+        df = build_text(df, with_hash=self.with_hash)
+        self.before += len(df)
+        self.removed += int((df["text_len"] < self.min_len).sum())
+        df_kept = df[df["text_len"] >= self.min_len]
+        self.after += len(df_kept)
+
+        self.text_lens.append(df["text_len"])
+        cols = self.EXAMPLE_COLS
+        candidates = df[cols] if self.shortest is None else pd.concat([self.shortest, df[cols]])
+        self.shortest = candidates.sort_values("text_len", kind="mergesort").head(5)
+        return df_kept
+
+    def report(self):
+        return {
+            "rows_before": int(self.before),
+            "rows_after": int(self.after),
+            "removed_short_text": int(self.removed),
+            "min_len": int(self.min_len),
+            "text_len_describe": pd.concat(self.text_lens, ignore_index=True).describe().to_dict(),
+            "removed_examples_shortest5": self.shortest.to_dict(orient="records"),
+        }
+
+@instrument
 def main():
     ap = argparse.ArgumentParser(description="Build text field + minimal text-length filter (Paper 2).")
-    ap.add_argument("--in", dest="in_csv", required=True, help="Path to airflow_working.csv")
-    ap.add_argument("--out_csv", required=True, help="Output processed CSV")
+    ap.add_argument("--in", dest="in_csv", required=True, help="Path to airflow_working.csv (or the 01 --out_table file)")
+    ap.add_argument("--out_csv", required=True, help="Output processed table (.csv, .parquet or .arrow)")
     ap.add_argument("--out_report", required=True, help="Output JSON report")
     ap.add_argument("--min_len", type=int, default=30, help="Minimum text length to keep (default: 30)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per streamed chunk")
+    ap.add_argument("--engine", default="c", choices=["c", "python"], help="CSV parser (python = slow fallback)")
+    ap.add_argument("--also_csv", action="store_true", help="With a columnar --out_csv, also write a .csv export")
+    ap.add_argument("--text_index", default=None,
+                    help="Optional issue_key,text_len,text_hash table for kept rows (dedup / caching downstream)")
+    ap.add_argument("--text_store", default=None,
+                    help="Optional text store directory: kept texts go there and --out_csv gets a text_ref column instead")
     args = ap.parse_args()
 
     in_csv = Path(args.in_csv)
@@ -31,41 +97,35 @@ def main():
     out_csv.parent.mkdir(parents=True, exist_ok=True)
     out_report.parent.mkdir(parents=True, exist_ok=True)
 
-    df = pd.read_csv(
-        in_csv,
-        names=COLS,
-        header=None,
-        dtype=str,
-        engine="python",
-    )
+    # Single streaming pass: build text, apply the min_len filter and append kept rows as we go.
+    text_pass = TextPass(args.min_len, with_hash=args.text_index is not None)
+    out_cols = COLS + [TEXT_REF if args.text_store else "text", "text_len"]
+    table_out = TableWriter(out_csv, also_csv=args.also_csv, columns=out_cols)
+    index_out = TableWriter(args.text_index, columns=["issue_key", "text_len", "text_hash"]) if args.text_index else None
+    store_out = TextStoreWriter(args.text_store) if args.text_store else None
+    for df in timed(iter_export_chunks(in_csv, chunksize=args.chunksize, engine=args.engine), "read"):
+        with phase("compute"):
+            df_kept = text_pass.process(df)
+
+        with phase("write"):
+            if index_out is not None:
+                index_out.write(df_kept[["issue_key", "text_len", "text_hash"]])
+                df_kept = df_kept.drop(columns=["text_hash"])
+            if store_out is not None:
+                refs = store_out.write(df_kept["issue_key"], df_kept["text"].tolist())
+                df_kept = df_kept.assign(text=refs).rename(columns={"text": TEXT_REF})
+            table_out.write(df_kept)
+    with phase("write"):
+        table_out.close()
+        if store_out is not None:
+            store_out.close()
+        if index_out is not None:
+            index_out.close()
+    before, after, removed = text_pass.before, text_pass.after, text_pass.removed
+    count_rows(rows_in=before, rows_out=after)
+
+    report = text_pass.report()
 
-    # LOCKED: text comes from summary only (it contains embedded description content in this export)
-    df["text"] = (
-        df["summary"]
-        .astype(str)
-        .str.replace(r"\s+", " ", regex=True)
-        .str.strip()
-    )
-    df["text_len"] = df["text"].str.len()
-
-    before = len(df)
-    removed = int((df["text_len"] < args.min_len).sum())
-    df_kept = df[df["text_len"] >= args.min_len].copy()
-    after = len(df_kept)
-
-    report = {
-        "rows_before": int(before),
-        "rows_after": int(after),
-        "removed_short_text": int(removed),
-        "min_len": int(args.min_len),
-        "text_len_describe": df["text_len"].describe().to_dict(),
-        "removed_examples_shortest5": (
-            df.sort_values("text_len")[["issue_key","priority","issue_type","status","text_len","text"]]
-            .head(5).to_dict(orient="records")
-        ),
-    }
-
-    df_kept.to_csv(out_csv, index=False)
     out_report.write_text(json.dumps(report, indent=2), encoding="utf-8")
 
     print("OK")
@@ -74,6 +134,10 @@ def main():
     print(f"Removed (<{args.min_len} chars): {removed}")
     print(f"Wrote: {out_csv}")
     print(f"Wrote: {out_report}")
+    if index_out is not None:
+        print(f"Wrote: {args.text_index}")
+    if store_out is not None:
+        print(f"Wrote: {args.text_store}")
 
 if __name__ == "__main__":
     main()
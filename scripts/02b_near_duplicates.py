@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate issue detection between 02 and 03 (MinHash + LSH, Paper 2).
+
+- Shingles: word n-grams (--shingle_words) of the lower-cased 02 `text`; shorter texts are one shingle
+- MinHash signatures (--num_perm) with seeded multiply-shift hashes, so runs are reproducible
+- LSH: bands x rows chosen for --threshold; within a band bucket, members are compared with the
+  bucket's representatives (not with each other) and accepted when the signature-estimated
+  Jaccard >= --threshold, then joined into clusters
+- Each cluster keeps the issue the priority-only baseline would rank first (03 ordering);
+  --mode collapse drops the others, --mode flag keeps every row and adds dup_* columns
+- Does NOT rank: 03 still builds the ordering over the rows written here
+"""
+
+import argparse
+import json
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from jira_export import DEFAULT_CHUNKSIZE
+from pipeline_stages import load_stage
+from stage_metrics import count_rows, instrument, phase, timed
+from table_io import TableWriter, iter_table_chunks, read_columns
+from text_store import TEXT_REF, TextStore, text_columns
+
+KEY_COLS = ["issue_key", "priority", "created_ts", "text"]
+
+MAX_BATCH_SHINGLES = 1_000_000  # shingles hashed per batch (x PERM_BLOCK uint64 = 128 MB)
+PERM_BLOCK = 16
+WORD_CACHE_MAX = 2_000_000  # distinct words whose hash is memoized
+
+
+def lsh_params(threshold, num_perm, fn_weight=0.8):
+    """(bands, rows) minimizing weighted false positives + false negatives around `threshold`.
+
+    Candidates are verified against the signatures afterwards, so a false positive only costs a
+    comparison; missed pairs are weighted higher.
+    """
+    s = np.linspace(0.0, 1.0, 1001)
+    best = None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        p = 1.0 - (1.0 - s**rows) ** bands
+        err = (1.0 - fn_weight) * p[s < threshold].sum() + fn_weight * (1.0 - p[s >= threshold]).sum()
+        if best is None or err < best[0]:
+            best = (err, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    def __init__(self, num_perm, shingle_words, seed):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.k = shingle_words
+        # Odd multipliers for the multiply-shift family h(x) = (a*x + b) >> 32 (mod 2^64)
+        self.a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        self.mix = rng.integers(1, 2**63, shingle_words, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._word_hash = {}
+
+    def _hash_word(self, w):
+        h = zlib.crc32(w.encode("utf-8"))
+        if len(self._word_hash) < WORD_CACHE_MAX:
+            self._word_hash[w] = h
+        return h
+
+    def _shingles(self, texts):
+        """Concatenated shingle hashes of `texts` plus the start offset of each text's shingles."""
+        word_hashes = []
+        n_words = []
+        cached = self._word_hash.get
+        for t in texts:
+            words = t.lower().split()
+            # Backlog vocabularies are small, so most words hit the memo (a crc32 of 0 just misses it)
+            word_hashes.extend([cached(w) or self._hash_word(w) for w in words])
+            n_words.append(len(words))
+        wh = np.asarray(word_hashes, dtype=np.uint64)
+        n_words = np.asarray(n_words, dtype=np.int64)
+        n_sh = np.maximum(n_words - self.k + 1, 1)
+        word_start = np.concatenate([[0], np.cumsum(n_words)[:-1]])
+        sh_start = np.concatenate([[0], np.cumsum(n_sh)[:-1]])
+        doc = np.repeat(np.arange(len(n_sh)), n_sh)
+        pos = word_start[doc] + (np.arange(len(doc)) - sh_start[doc])
+        end = (word_start + n_words)[doc]
+        h = np.zeros(len(doc), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for t in range(self.k):
+                idx = pos + t
+                valid = idx < end
+                h += np.where(valid, wh[np.minimum(idx, len(wh) - 1)], 0) * self.mix[t]
+        return h, sh_start
+
+    def signatures(self, texts):
+        """uint32 signature matrix (len(texts) x num_perm); every text must have at least one word."""
+        h, starts = self._shingles(texts)
+        sig = np.empty((self.num_perm, len(texts)), dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            for p0 in range(0, self.num_perm, PERM_BLOCK):
+                a = self.a[p0:p0 + PERM_BLOCK]
+                b = self.b[p0:p0 + PERM_BLOCK]
+                # (perms x shingles) so reduceat runs along contiguous rows
+                hv = ((a[:, None] * h[None, :] + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+                sig[p0:p0 + PERM_BLOCK] = np.minimum.reduceat(hv, starts, axis=1)
+        return sig.T
+
+
+def similar_pairs(sig, bands, rows, seed, threshold):
+    """Row pairs with estimated Jaccard >= threshold found through LSH band buckets, and the number
+    of signature comparisons made.
+
+    Rows with identical signatures are linked to the first of them (estimated Jaccard 1). In each
+    bucket the first member not yet covered becomes a representative and is compared with every
+    other member; the members it accepts are covered and the next uncovered member is the next
+    representative. A bucket costs (members x clusters in it) comparisons instead of members^2, so
+    large buckets of templated text stay linear.
+    """
+    if not len(sig):
+        return np.zeros((0, 2), dtype=np.int64), 0
+    # Identical signatures: star-link to the first row
+    row_bytes = np.ascontiguousarray(sig).view(np.dtype((np.void, sig.shape[1] * sig.itemsize))).ravel()
+    _, first, inv = np.unique(row_bytes, return_index=True, return_inverse=True)
+    inv = inv.ravel()
+    dup = np.flatnonzero(first[inv] != np.arange(len(sig)))
+    pairs = [np.stack([first[inv[dup]], dup], axis=1)]
+
+    usig = sig[first]
+    rng = np.random.default_rng(seed + 1)
+    compared = 0
+    for band in range(bands):
+        cols = usig[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        mult = rng.integers(1, 2**63, rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        with np.errstate(over="ignore"):
+            key = (cols * mult[None, :]).sum(axis=1)
+        order = np.argsort(key, kind="stable")
+        k = key[order]
+        run = np.cumsum(np.concatenate([[True], k[1:] != k[:-1]])) - 1
+        n_runs = int(run[-1]) + 1
+        pos = np.flatnonzero(np.bincount(run)[run] > 1)  # sorted positions in shared buckets
+        uncovered = np.ones(len(k), dtype=bool)
+        while len(pos):
+            # Buckets with uncovered members left; their first uncovered member is the representative
+            is_open = np.zeros(n_runs, dtype=bool)
+            is_open[run[pos[uncovered[pos]]]] = True
+            pos = pos[is_open[run[pos]]]
+            if not len(pos):
+                break
+            open_pos = pos[uncovered[pos]]
+            rep_runs, at = np.unique(run[open_pos], return_index=True)
+            rep_of_run = np.full(n_runs, -1, dtype=np.int64)
+            rep_of_run[rep_runs] = open_pos[at]
+            uncovered[open_pos[at]] = False
+            others = pos[rep_of_run[run[pos]] != pos]
+            a, b = order[rep_of_run[run[others]]], order[others]
+            hit = estimated_jaccard(usig, a, b) >= threshold
+            compared += len(others)
+            pairs.append(np.stack([first[a[hit]], first[b[hit]]], axis=1))
+            uncovered[others[hit]] = False
+    pairs = np.concatenate(pairs)
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0), compared
+
+
+def estimated_jaccard(sig, i, j, block=200_000):
+    out = np.empty(len(i), dtype=np.float64)
+    for s in range(0, len(i), block):
+        out[s:s + block] = (sig[i[s:s + block]] == sig[j[s:s + block]]).mean(axis=1)
+    return out
+
+
+def clusters_from_pairs(n, pairs):
+    """Union-find over accepted pairs; returns a root id per row."""
+    parent = np.arange(n)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs.tolist():
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(x) for x in range(n)]) if len(pairs) else parent
+
+
+def baseline_position(keys):
+    """Position of each row in the 03 priority-only ordering (lower = ranked first)."""
+    base = load_stage("03_priority_only_baseline")
+    slim = keys[["issue_key", "priority", "created_ts"]].copy()
+    slim["_row"] = np.arange(len(slim))
+    ranked = base.rank_full(base.add_sort_keys(slim))
+    pos = np.empty(len(slim), dtype=np.int64)
+    pos[ranked["_row"].to_numpy()] = np.arange(len(slim))
+    return pos
+
+
+@instrument
+def main():
+    ap = argparse.ArgumentParser(description="Flag or collapse near-duplicate issues (MinHash/LSH) before 03.")
+    ap.add_argument("--in_csv", required=True, help="Processed table from 02 (.csv, .parquet or .arrow)")
+    ap.add_argument("--out_csv", required=True, help="Processed table with near-duplicates collapsed/flagged")
+    ap.add_argument("--out_report", required=True, help="Output JSON report (parameters, counts, largest clusters)")
+    ap.add_argument("--out_clusters", default=None, help="Optional table: one row per issue in a duplicate cluster")
+    ap.add_argument("--mode", default="collapse", choices=["collapse", "flag"])
+    ap.add_argument("--threshold", type=float, default=0.8, help="Jaccard similarity of word shingles")
+    ap.add_argument("--num_perm", type=int, default=128, help="MinHash signature length")
+    ap.add_argument("--shingle_words", type=int, default=3, help="Words per shingle")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per streamed chunk")
+    ap.add_argument("--text_store", default=None, help="Text store (02 --text_store) when --in_csv has text_ref")
+    args = ap.parse_args()
+
+    hasher = MinHasher(args.num_perm, args.shingle_words, args.seed)
+    bands, rows = lsh_params(args.threshold, args.num_perm)
+
+    # Pass 1: signatures (texts are not kept), plus the columns that decide cluster representatives
+    key_parts = []
+    sig_parts = []
+    has_text_parts = []
+    in_cols = text_columns(KEY_COLS, read_columns(args.in_csv))
+    store = None
+    if TEXT_REF in in_cols:
+        if not args.text_store:
+            raise ValueError(f"{args.in_csv} has {TEXT_REF} instead of text; pass --text_store")
+        store = TextStore(args.text_store)
+    for chunk in timed(iter_table_chunks(args.in_csv, args.chunksize, columns=in_cols), "read"):
+        if store is not None:
+            chunk["text"] = store.get(pd.to_numeric(chunk[TEXT_REF]).to_numpy(dtype=np.int64))
+        with phase("minhash"):
+            texts = chunk["text"].fillna("").astype(str).tolist()
+            has_text = np.array([bool(t.strip()) for t in texts])
+            sig = np.full((len(texts), args.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+            batch = []
+            batch_rows = []
+            batch_est = 0
+            for r in np.flatnonzero(has_text):
+                batch.append(texts[r])
+                batch_rows.append(r)
+                batch_est += len(texts[r]) // 5 + 1  # ~ words (= shingles) in this text
+                if batch_est >= MAX_BATCH_SHINGLES:
+                    sig[batch_rows] = hasher.signatures(batch)
+                    batch, batch_rows, batch_est = [], [], 0
+            if batch:
+                sig[batch_rows] = hasher.signatures(batch)
+        key_parts.append(chunk[["issue_key", "priority", "created_ts"]].reset_index(drop=True))
+        sig_parts.append(sig)
+        has_text_parts.append(has_text)
+
+    keys = pd.concat(key_parts, ignore_index=True) if key_parts else pd.DataFrame(columns=KEY_COLS[:3])
+    sig = np.concatenate(sig_parts) if sig_parts else np.zeros((0, args.num_perm), dtype=np.uint32)
+    has_text = np.concatenate(has_text_parts) if has_text_parts else np.zeros(0, dtype=bool)
+    n = len(keys)
+    count_rows(rows_in=n)
+
+    with phase("lsh"):
+        # Rows without text never join a cluster
+        valid = np.flatnonzero(has_text)
+        accepted, compared = similar_pairs(sig[valid], bands, rows, args.seed, args.threshold)
+        accepted = valid[accepted] if len(accepted) else accepted
+        root = clusters_from_pairs(n, accepted)
+
+    with phase("compute"):
+        pos = baseline_position(keys)
+        sizes = np.bincount(root, minlength=n)
+        in_cluster = sizes[root] > 1
+        # Representative = cluster member ranked first by the 03 baseline ordering
+        rep_of_root = np.full(n, -1, dtype=np.int64)
+        members = np.flatnonzero(in_cluster)
+        for r in members[np.argsort(pos[members], kind="stable")][::-1]:
+            rep_of_root[root[r]] = r
+        rep = np.where(in_cluster, rep_of_root[root], np.arange(n))
+        is_dup = in_cluster & (rep != np.arange(n))
+
+        cluster_roots = np.unique(root[in_cluster])
+        cluster_id = np.full(n, -1, dtype=np.int64)
+        cluster_id[in_cluster] = np.searchsorted(cluster_roots, root[in_cluster])
+        issue_keys = keys["issue_key"].to_numpy(dtype=object)
+        sim_to_rep = np.ones(n)
+        if len(members):
+            sim_to_rep[members] = estimated_jaccard(sig, members, rep[members])
+
+    # Pass 2: stream the full table again, dropping (collapse) or annotating (flag) duplicates
+    out_csv = Path(args.out_csv)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    offset = 0
+    with TableWriter(out_csv) as table_out:
+        for chunk in timed(iter_table_chunks(args.in_csv, args.chunksize), "read"):
+            sl = slice(offset, offset + len(chunk))
+            offset += len(chunk)
+            if args.mode == "collapse":
+                chunk = chunk[~is_dup[sl]]
+            else:
+                cid = cluster_id[sl]
+                chunk["dup_cluster"] = pd.array(np.where(cid >= 0, cid, None), dtype="Int64")
+                chunk["dup_of"] = np.where(is_dup[sl], issue_keys[rep[sl]], None)
+                chunk["is_near_duplicate"] = is_dup[sl]
+            with phase("write"):
+                table_out.write(chunk)
+            written += len(chunk)
+    count_rows(rows_out=written)
+
+    # Clusters, largest first (ties by the representative's baseline position)
+    order = np.argsort(root[members], kind="stable")
+    clusters = np.split(members[order], np.flatnonzero(np.diff(root[members][order])) + 1) if len(members) else []
+    clusters = sorted(clusters, key=lambda m: (-len(m), pos[rep[m[0]]]))
+
+    if args.out_clusters:
+        recs = []
+        for m in clusters:
+            m = m[np.argsort(pos[m], kind="stable")]
+            for r in m:
+                recs.append({
+                    "cluster_id": int(cluster_id[r]),
+                    "issue_key": issue_keys[r],
+                    "representative": issue_keys[rep[r]],
+                    "is_representative": bool(rep[r] == r),
+                    "est_jaccard_to_rep": round(float(sim_to_rep[r]), 4),
+                })
+        with TableWriter(args.out_clusters) as clusters_out:
+            clusters_out.write(pd.DataFrame(recs, columns=["cluster_id", "issue_key", "representative",
+                                                           "is_representative", "est_jaccard_to_rep"]))
+
+    report = {
+        "mode": args.mode,
+        "threshold": args.threshold,
+        "num_perm": args.num_perm,
+        "lsh_bands": bands,
+        "lsh_rows_per_band": rows,
+        "shingle_words": args.shingle_words,
+        "seed": args.seed,
+        "rows_before": int(n),
+        "rows_after": int(written),
+        "rows_without_text": int((~has_text).sum()),
+        "compared_pairs": int(compared),
+        "accepted_pairs": int(len(accepted)),
+        "clusters": int(len(cluster_roots)),
+        "near_duplicates": int(is_dup.sum()),
+        "largest_clusters_top20": [
+            {
+                "size": int(len(m)),
+                "representative": issue_keys[rep[m[0]]],
+                "members": [issue_keys[r] for r in m[np.argsort(pos[m], kind="stable")]][:50],
+            }
+            for m in clusters[:20]
+        ],
+    }
+    out_report = Path(args.out_report)
+    out_report.parent.mkdir(parents=True, exist_ok=True)
+    out_report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print("OK")
+    print(f"Rows before: {n}")
+    print(f"Near-duplicate clusters: {len(cluster_roots)} ({int(is_dup.sum())} duplicates, mode={args.mode})")
+    print(f"Rows written: {written}")
+    print(f"Wrote: {out_csv}")
+    print(f"Wrote: {out_report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,13 @@
 import argparse
 import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from stage_metrics import count_rows, instrument, phase
+from table_io import read_columns, read_compact, write_table
+from text_store import text_columns
+
 PRIORITY_ORDER = {
     "Blocker": 1,
     "Critical": 2,
@@ -12,73 +17,136 @@ PRIORITY_ORDER = {
     "Trivial": 5,
 }
 
-def main():
-    ap = argparse.ArgumentParser(description="Build priority-only baseline ordering (Paper 2).")
-    ap.add_argument("--in_csv", required=True, help="Processed CSV with text/text_len (minlen applied).")
-    ap.add_argument("--out_csv", required=True, help="Output baseline CSV with rank.")
-    ap.add_argument("--out_report", required=True, help="Output JSON report.")
-    args = ap.parse_args()
+# Columns this stage needs from the processed table
+IN_COLS = ["issue_key", "project", "created_ts", "updated_ts", "issue_type", "status", "priority", "text_len", "text"]
 
-    in_csv = Path(args.in_csv)
-    out_csv = Path(args.out_csv)
-    out_report = Path(args.out_report)
-    out_csv.parent.mkdir(parents=True, exist_ok=True)
-    out_report.parent.mkdir(parents=True, exist_ok=True)
-
-    df = pd.read_csv(in_csv, dtype=str)
+# Output columns of the baseline table
+KEEP_COLS = [
+    "rank_priority_only",
+    "issue_key",
+    "project",
+    "created_ts",
+    "updated_ts",
+    "issue_type",
+    "status",
+    "priority",
+    "priority_ordinal",
+    "text_len",
+    "text",
+]
 
+def add_sort_keys(df):
+    """Add priority_ordinal and created_ts_num (the ordering keys), with the safety checks."""
     # Map priority to ordinal (industrial signal only)
-    df["priority_ordinal"] = df["priority"].map(PRIORITY_ORDER)
+    ordinal = df["priority"].map(PRIORITY_ORDER)
+    if isinstance(ordinal.dtype, pd.CategoricalDtype):
+        ordinal = ordinal.astype("float64")  # categorical priority (read_compact) maps per category
 
     # Safety checks
-    missing_ord = df["priority_ordinal"].isna().sum()
+    missing_ord = ordinal.isna().sum()
     if missing_ord > 0:
-        bad = df[df["priority_ordinal"].isna()]["priority"].value_counts().to_dict()
+        bad = df[ordinal.isna()]["priority"].value_counts()
+        bad = bad[bad > 0].to_dict()
         raise ValueError(f"Unknown priority values encountered: {bad}")
+    df["priority_ordinal"] = ordinal.astype("int64")
 
     # Make timestamps numeric for sorting
     df["created_ts_num"] = pd.to_numeric(df["created_ts"], errors="coerce")
     if df["created_ts_num"].isna().sum() > 0:
         raise ValueError("Some created_ts could not be parsed as numeric.")
+    return df
 
+def rank_full(df):
     # Priority-only ordering with deterministic ties
-    df = df.sort_values(
+    return df.sort_values(
         by=["priority_ordinal", "created_ts_num", "issue_key"],
         ascending=[True, True, True],
         kind="mergesort",  # stable sort
     ).reset_index(drop=True)
 
+def rank_top_k(df, k):
+    """First k rows of rank_full(df) without sorting everything.
+
+    (priority_ordinal, created_ts) is packed into one int64 and the k-th smallest key is found with a
+    partial selection; only rows up to that key (boundary ties included) are then sorted with the full
+    tie-break, so the result is identical to rank_full(df).head(k).
+    """
+    ts = df["created_ts_num"].to_numpy(dtype="float64")
+    if k >= len(df) or not (np.all(ts == np.floor(ts)) and ts.min() >= 0 and ts.max() < 2**56):
+        return rank_full(df).head(k)
+    packed = (df["priority_ordinal"].to_numpy(dtype="int64") << 56) | ts.astype("int64")
+    kth = np.partition(packed, k - 1)[k - 1]
+    cand = df[packed <= kth].assign(_packed=packed[packed <= kth])
+    cand = cand.sort_values(by=["_packed", "issue_key"], kind="mergesort").drop(columns=["_packed"])
+    return cand.head(k).reset_index(drop=True)
+
+def priority_distribution(df):
+    # Same ordering as value_counts() over the ranked table: count desc, ties by priority order
+    counts = df["priority"].value_counts(sort=False)
+    counts = counts[counts > 0]  # unused categories of a categorical column
+    order = sorted(counts.index, key=lambda p: (-counts[p], PRIORITY_ORDER[p]))
+    return {p: int(counts[p]) for p in order}
+
+def rank_baseline(df, top_k=None):
+    """Ranked baseline (all rows, or the first top_k) with rank_priority_only, and the 03 report."""
+    df = add_sort_keys(df)
+
+    rows = len(df)
+    distribution = priority_distribution(df)
+    if top_k is None:
+        df = rank_full(df)
+    else:
+        df = rank_top_k(df, top_k)
+
     df["rank_priority_only"] = df.index + 1
 
     # Minimal report for paper + sanity
     report = {
-        "rows": int(len(df)),
-        "priority_distribution": df["priority"].value_counts().to_dict(),
+        "rows": int(rows),
+        "priority_distribution": distribution,
         "ordering": {
             "primary": "priority (Blocker > Critical > Major > Minor > Trivial)",
             "tie_breakers": ["created_ts (older first)", "issue_key (asc)"],
         },
         "top10_issue_keys": df.head(10)["issue_key"].tolist(),
     }
+    if top_k is not None:
+        report["top_k"] = int(top_k)
+    return df, report
+
+@instrument
+def main():
+    ap = argparse.ArgumentParser(description="Build priority-only baseline ordering (Paper 2).")
+    ap.add_argument("--in_csv", required=True, help="Processed table with text/text_len (minlen applied).")
+    ap.add_argument("--out_csv", required=True, help="Output baseline table with rank (.csv, .parquet or .arrow).")
+    ap.add_argument("--out_report", required=True, help="Output JSON report.")
+    ap.add_argument("--also_csv", action="store_true", help="With a columnar --out_csv, also write a .csv export")
+    ap.add_argument("--top_k", type=int, default=None,
+                    help="Only rank and write the first K rows (partial selection); default: full ranking")
+    args = ap.parse_args()
+
+    in_csv = Path(args.in_csv)
+    out_csv = Path(args.out_csv)
+    out_report = Path(args.out_report)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    out_report.parent.mkdir(parents=True, exist_ok=True)
+
+    with phase("read"):
+        # Categorical priority/status/type/project, int64 timestamps: a fraction of the dtype=str size
+        # A table from 02 --text_store carries text_ref instead of text (ranking never needs the text)
+        df = read_compact(in_csv, columns=text_columns(IN_COLS, read_columns(in_csv)))
+
+    with phase("compute"):
+        df, report = rank_baseline(df, args.top_k)
+    rows = report["rows"]
+    count_rows(rows_in=rows, rows_out=len(df))
 
-    keep_cols = [
-        "rank_priority_only",
-        "issue_key",
-        "project",
-        "created_ts",
-        "updated_ts",
-        "issue_type",
-        "status",
-        "priority",
-        "priority_ordinal",
-        "text_len",
-        "text",
-    ]
-    df[keep_cols].to_csv(out_csv, index=False)
-    out_report.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    with phase("write"):
+        write_table(df[text_columns(KEEP_COLS, df.columns)], out_csv, also_csv=args.also_csv)
+        out_report.write_text(json.dumps(report, indent=2), encoding="utf-8")
 
     print("OK")
-    print(f"Rows: {len(df)}")
+    print(f"Rows: {rows}" + (f" (wrote top {len(df)})" if args.top_k is not None else ""))
     print(f"Wrote: {out_csv}")
     print(f"Wrote: {out_report}")
     print("Top-10 issue keys:")
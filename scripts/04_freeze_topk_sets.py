@@ -3,30 +3,49 @@ import argparse
 from pathlib import Path
 import pandas as pd
 
+from stage_metrics import count_rows, instrument, phase
+from table_io import read_rows, read_table, write_table
+
+SUFFIX = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+@instrument
 def main():
     ap = argparse.ArgumentParser(description="Freeze Top-K selection sets from priority-only baseline.")
-    ap.add_argument("--in_csv", required=True, help="priority_only_baseline.csv")
-    ap.add_argument("--out_dir", required=True, help="Directory to write top-k CSVs")
+    ap.add_argument("--in_csv", required=True, help="priority_only_baseline table (.csv, .parquet or .arrow)")
+    ap.add_argument("--out_dir", required=True, help="Directory to write top-k tables")
     ap.add_argument("--ks", default="50,100,250,500", help="Comma-separated K values")
+    ap.add_argument("--format", default="csv", choices=sorted(SUFFIX), help="Output format for top-k sets")
     args = ap.parse_args()
 
     in_csv = Path(args.in_csv)
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    df = pd.read_csv(in_csv, dtype=str)
-    df["rank_priority_only"] = pd.to_numeric(df["rank_priority_only"], errors="raise")
+    # Only the rank column is needed to decide the selection; rows are fetched afterwards.
+    with phase("read"):
+        ranks = read_table(in_csv, columns=["rank_priority_only"])
+    ranks["rank_priority_only"] = pd.to_numeric(ranks["rank_priority_only"], errors="raise")
 
     ks = [int(x.strip()) for x in args.ks.split(",") if x.strip()]
     max_k = max(ks)
 
-    if max_k > len(df):
-        raise ValueError(f"Requested K={max_k} but dataset has only {len(df)} rows.")
+    if max_k > len(ranks):
+        raise ValueError(f"Requested K={max_k} but dataset has only {len(ranks)} rows.")
+
+    # Row positions of the max-K selection; the baseline is rank-ordered so this is usually a prefix.
+    with phase("compute"):
+        positions = ranks.nsmallest(max_k, "rank_priority_only").index
+    with phase("read"):
+        df = read_rows(in_csv, positions)
+    df["rank_priority_only"] = ranks["rank_priority_only"].loc[positions].to_numpy()
+    count_rows(rows_in=len(ranks), rows_out=len(df))
 
+    # Rows are in rank order, so every Top-K is a prefix of the max-K selection
     for k in ks:
-        topk = df.nsmallest(k, "rank_priority_only").copy()
-        out_path = out_dir / f"baseline_topk_{k}.csv"
-        topk.to_csv(out_path, index=False)
+        topk = df.head(k)
+        out_path = out_dir / f"baseline_topk_{k}{SUFFIX[args.format]}"
+        with phase("write"):
+            write_table(topk, out_path)
 
     print("OK")
     print(f"Read: {in_csv}")
@@ -4,44 +4,218 @@ Apply PRISM readiness gate to a priority-based selection set.
 
 IMPORTANT: This script MUST NOT rank or optimize priorities.
 It only assigns gate labels (ELIGIBLE / INSPECT / DEFER) based on readiness signals.
+
+- Streaming counterpart of 07: selection and scores are read in chunks, sorted by issue_key
+  out of core (external_sort.py), merge-joined and labelled block by block
+- Labels from the locked gate config (readiness_gate.py): ELIGIBLE = passes the gate,
+  DEFER = fails a threshold; selected issues without PRISM scores fail the run (as before the
+  streaming rewrite) unless --inspect_missing labels them INSPECT
+- Selection and scores must each have one row per issue_key (checked during the merge-join)
+- Output keeps the selection order (labelled rows are re-sorted by selection position on disk);
+  --presorted skips both sorts when the inputs are already in issue_key order
+- Memory is bounded by --chunksize, not by the size of the selection or score files
+  (LOCKED_GATE_V2 thresholds load the S/V columns for exact quantiles, as 07 does;
+  --quantiles sketch takes them from the scores' quantile sketch instead)
 """
 import argparse
+import itertools
+import tempfile
 from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
+from external_sort import merge_runs, sort_runs
+from jira_export import DEFAULT_CHUNKSIZE
+from quantile_sketch import score_sketches
+from readiness_gate import BIT, decode_reasons, gate_mask, gate_thresholds, load_gate_cfg
+from stage_metrics import count_rows, instrument, phase
+from table_io import TableWriter, iter_table_chunks, read_columns
+
+POS = "_sel_pos"
+
+
+def with_positions(chunks):
+    """Tag rows with their position in the stream (to restore the selection order later)."""
+    start = 0
+    for chunk in chunks:
+        chunk[POS] = np.arange(start, start + len(chunk), dtype=np.int64)
+        start += len(chunk)
+        yield chunk
+
+
+def check_sorted(blocks, name):
+    last = None
+    for block in blocks:
+        if not len(block):
+            continue
+        # Keyless rows are not joined, so they may sit anywhere
+        keys = block["issue_key"].dropna()
+        if len(keys):
+            if not keys.is_monotonic_increasing or (last is not None and keys.iloc[0] < last):
+                raise ValueError(f"--presorted: {name} is not sorted by issue_key")
+            last = keys.iloc[-1]
+        yield block
+
+
+def duplicate_error(side, keys):
+    return ValueError(f"Duplicate issue_key in the {side}; the gate needs one row per issue. "
+                      f"Example keys: {keys.head(20).tolist()}")
+
+
+def join_sorted(sel_blocks, score_blocks):
+    """Left merge-join of two issue_key-sorted streams, each with one row per issue_key."""
+    score_blocks = iter(score_blocks)
+    buf, more = None, True
+    last = None
+    for block in sel_blocks:
+        keys = block["issue_key"].dropna()
+        if not len(keys):
+            if len(block):
+                yield block  # keyless rows only: nothing to join (no scores)
+            continue
+        # Sorted stream: a repeated key is adjacent, within a block or across the block boundary
+        dup = keys[keys.duplicated()]
+        if last is not None and keys.iloc[0] == last:
+            dup = pd.concat([keys.iloc[:1], dup])
+        if len(dup):
+            raise duplicate_error("selection", dup)
+        hi = last = keys.iloc[-1]
+        # Read scores past `hi`, so every score row of a key <= hi is buffered
+        while more and (buf is None or not len(buf) or buf["issue_key"].iloc[-1] <= hi):
+            nxt = next(score_blocks, None)
+            if nxt is None:
+                more = False
+            elif len(nxt):
+                buf = nxt if buf is None else pd.concat([buf, nxt], ignore_index=True)
+        if buf is None:
+            buf = pd.DataFrame({"issue_key": pd.Series([], dtype=block["issue_key"].dtype)})
+        use = buf.iloc[: int(buf["issue_key"].searchsorted(hi, side="right"))]
+        dup = use["issue_key"][use["issue_key"].duplicated()]
+        if len(dup):
+            raise ValueError(f"Duplicate PRISM scores for some issues. Example keys: {dup.head(20).tolist()}")
+        yield block.merge(use, on="issue_key", how="left")
+        # Selection keys are unique, so later blocks only need scores past `hi`
+        buf = buf.iloc[int(buf["issue_key"].searchsorted(hi, side="right")):]
+
 
+def require_scores(blocks):
+    """Pass joined blocks through, failing on the first selected issue without C/S/V scores."""
+    for block in blocks:
+        miss = block.reindex(columns=["C", "S", "V"]).isna().any(axis=1)
+        if miss.any():
+            keys = block.loc[miss, "issue_key"]
+            keyless = f" (and {keys.isna().sum()} rows without issue_key)" if keys.isna().any() else ""
+            raise ValueError(f"Missing PRISM scores for some issues. Example keys: "
+                             f"{keys.dropna().head(20).tolist()}{keyless}")
+        yield block
+
+
+def label(joined, cfg, thresholds, set_name):
+    mask = gate_mask(joined, cfg, thresholds)
+    joined["set_name"] = set_name
+    joined["gate_label"] = np.where(mask == 0, "ELIGIBLE", np.where(mask == BIT["missing_scores"], "INSPECT", "DEFER"))
+    joined["gate_reason"] = [";".join(r) for r in decode_reasons(mask)]
+    return joined
+
+
+def score_scope(scores_csv, chunksize):
+    """S/V columns of the full scores scope (LOCKED_GATE_V2 quantiles are taken over it)."""
+    parts = [c.apply(pd.to_numeric, errors="coerce") for c in iter_table_chunks(scores_csv, chunksize, columns=["S", "V"])]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame({"S": [], "V": []})
+
+
+@instrument
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--selection_csv", required=True, help="One baseline_topk_K.csv")
     ap.add_argument("--scores_csv", required=True, help="PRISM scores file with issue_key,C,S,V (and optional reasons)")
     ap.add_argument("--out_csv", required=True, help="Gate-annotated output CSV")
+    ap.add_argument("--gate_cfg", required=True, help="Locked gate config (same file as 07)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Rows per streamed chunk / sorted run")
+    ap.add_argument("--presorted", action="store_true", help="Inputs are already sorted by issue_key (no external sort)")
+    ap.add_argument("--quantiles", default="exact", choices=["exact", "sketch"],
+                    help="V2 thresholds: exact quantiles (as 07) or the scores' quantile sketch (bounded memory)")
+    ap.add_argument("--inspect_missing", action="store_true",
+                    help="Label selected issues without PRISM scores INSPECT instead of failing")
+    ap.add_argument("--tmp_dir", default=None, help="Where sorted runs are spilled (default: next to --out_csv)")
     args = ap.parse_args()
 
-    sel = pd.read_csv(args.selection_csv, dtype=str)
-    scores = pd.read_csv(args.scores_csv, dtype=str)
+    cfg = load_gate_cfg(args.gate_cfg)
+    set_name = Path(args.selection_csv).stem
+    out_path = Path(args.out_csv)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # expected columns in scores (we will enforce once we have the real file)
-    # issue_key, C, S, V, (optional: reason_C, reason_S, reason_V)
-    merged = sel.merge(scores, on="issue_key", how="left", validate="one_to_one")
+    rule = cfg.get("rule", "LOCKED_GATE_V1")
+    with phase("read"):
+        if rule == "LOCKED_GATE_V2" and args.quantiles == "sketch":
+            thresholds = gate_thresholds(cfg, None, score_sketches(args.scores_csv, args.chunksize))
+        elif rule == "LOCKED_GATE_V2":
+            thresholds = gate_thresholds(cfg, score_scope(args.scores_csv, args.chunksize))
+        else:
+            thresholds = gate_thresholds(cfg, None)
 
-    # sanity: do not proceed if scores missing
-    if merged[["C", "S", "V"]].isna().any().any():
-        missing = merged[merged["C"].isna()]["issue_key"].head(20).tolist()
-        raise ValueError(f"Missing PRISM scores for some issues. Example keys: {missing}")
+    # Output columns: what the left merge of the two files produces
+    columns = pd.DataFrame(columns=read_columns(args.selection_csv)).merge(
+        pd.DataFrame(columns=read_columns(args.scores_csv)), on="issue_key", how="left").columns
+    sel_chunks = iter_table_chunks(args.selection_csv, args.chunksize)
+    # Scores without a key can never match a selection row
+    score_chunks = (c.dropna(subset=["issue_key"]) for c in iter_table_chunks(args.scores_csv, args.chunksize))
+    keyless = []
 
-    # TODO (Step 10.2): implement gate logic you already locked.
-    # For now, just create placeholder columns.
-    merged["set_name"] = Path(args.selection_csv).stem
-    merged["gate_label"] = "TODO"
-    merged["gate_reason"] = ""
+    def keyed(chunks):
+        # Selection rows without a key cannot be joined: they bypass the key sort (and get INSPECT)
+        for chunk in chunks:
+            miss = chunk["issue_key"].isna()
+            if miss.any():
+                keyless.append(chunk[miss])
+            yield chunk[~miss]
 
-    out_path = Path(args.out_csv)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    merged.to_csv(out_path, index=False)
+    labels = {"ELIGIBLE": 0, "INSPECT": 0, "DEFER": 0}
+    with tempfile.TemporaryDirectory(prefix="gate_runs_", dir=args.tmp_dir or out_path.parent) as tmp:
+        tmp = Path(tmp)
+        if args.presorted:
+            ordered = join_sorted(check_sorted(sel_chunks, "selection"), check_sorted(score_chunks, "scores"))
+            if not args.inspect_missing:
+                ordered = require_scores(ordered)
+        else:
+            # Reading the inputs is part of the sort phase (runs are spilled as chunks arrive)
+            with phase("sort"):
+                sel_runs = sort_runs(keyed(with_positions(sel_chunks)), "issue_key", tmp / "sel",
+                                     Path(args.selection_csv).suffix, dtypes={POS: "int64"})
+                score_runs = sort_runs(score_chunks, "issue_key", tmp / "scores", Path(args.scores_csv).suffix)
+            if keyless and not args.inspect_missing:
+                raise ValueError(f"Missing PRISM scores for {sum(len(k) for k in keyless)} selected rows "
+                                 "without issue_key")
+            block = max(1000, args.chunksize // max(1, len(sel_runs) + len(score_runs)))
+            joined = join_sorted(merge_runs(sel_runs, "issue_key", block, {POS: "int64"}),
+                                 merge_runs(score_runs, "issue_key", block))
+            if not args.inspect_missing:
+                joined = require_scores(joined)
+            # Back to selection order: joined blocks are collected into runs sorted by position
+            with phase("sort"):
+                runs = sort_runs(itertools.chain(joined, keyless), POS, tmp / "out", Path(args.selection_csv).suffix,
+                                 run_rows=args.chunksize, dtypes={POS: "int64"})
+            ordered = merge_runs(runs, POS, max(1000, args.chunksize // max(1, len(runs))), {POS: "int64"})
+
+        with TableWriter(out_path) as writer:
+            for part in ordered:
+                with phase("compute"):
+                    out = label(part.reindex(columns=columns), cfg, thresholds, set_name)
+                    for k, v in out["gate_label"].value_counts().items():
+                        labels[k] += int(v)
+                with phase("write"):
+                    writer.write(out)
+            rows = writer.rows
+    count_rows(rows_in=rows)
 
     print("OK")
     print(f"Wrote: {out_path}")
-    print("NOTE: gate_label is TODO until we wire the locked gate logic.")
+    print(f"rows={rows} " + " ".join(f"{k}={v}" for k, v in labels.items()))
+    if "rank_error" in thresholds:
+        print(f"V2 thresholds from sketch: S_q={thresholds['S_q']:.6g} V_q={thresholds['V_q']:.6g} "
+              f"(rank error <= {thresholds['rank_error']:.4f})")
+
 
 if __name__ == "__main__":
     main()
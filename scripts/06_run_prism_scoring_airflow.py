@@ -3,14 +3,35 @@
 Run PRISM readiness scoring (Criticality, Specificity, Volatility) for AIRFLOW.
 
 - Computes readiness signals ONLY (C, S, V)
-- Skips steps if outputs already exist
+- The three scorers are independent and run concurrently (--workers)
+- Skips a step only if its cache key (input CSV hash + scorer script + scorer args) is unchanged
+- Logs per-step wall time and peak RSS
+- Optional --shard_size: a scorer that normalizes within groups of a column (specificity: per
+  system) is run on shards of whole groups under <outdir>/shards/<column>/, every (shard, scorer)
+  pair a cached step of its own, so a crash only reruns unfinished shards; its output is then
+  assembled by concatenation. Scorers that normalize over the whole input (criticality and
+  volatility compare issues with each other) are never sharded, so scores equal an unsharded run
 - Merges using req_id (mapped 1:1 to issue_key)
+- Writes C/S/V quantile sketches next to the final scores (<final_out>.qsketch.npz), so gates can
+  take V2 thresholds without loading the scores; sketches of separate runs merge
 """
 
-import subprocess
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from issue_index import merge_on_key
+from quantile_sketch import build_sketches, save_sketches
+from stage_metrics import count_rows, instrument, phase, run_measured
+from table_io import iter_table_chunks, read_table
+
 ROOT = Path(__file__).resolve().parents[1]
 PRISM = ROOT / "prism" / "scripts"
 
@@ -19,9 +40,10 @@ OUTDIR = ROOT / "data" / "processed" / "prism_scores_tmp"
 FINAL_OUT = ROOT / "data" / "processed" / "prism_scores_airflow.csv"
 
 
-def run(cmd):
-    print("RUN:", " ".join(cmd))
-    subprocess.check_call(cmd)
+def log(msg):
+    # One write per line so messages from concurrent steps do not interleave
+    sys.stdout.write(msg + "\n")
+    sys.stdout.flush()
 
 
 def pick_col(df, candidates):
@@ -31,68 +53,226 @@ def pick_col(df, candidates):
     raise ValueError(f"None of {candidates} found in columns: {list(df.columns)}")
 
 
+def file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(input_hash, step):
+    """Content address of a step: input bytes + scorer source + scorer parameters."""
+    h = hashlib.sha256()
+    h.update(input_hash.encode())
+    h.update(step["name"].encode())
+    if step["script"].exists():
+        h.update(file_sha256(step["script"]).encode())
+    h.update(json.dumps(step["params"], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def build_steps(input_csv, outdir, args):
+    crit_path = outdir / "criticality_scored.csv"
+    spec_path = outdir / "specificity_scores.csv"
+    vol_path = outdir / "volatility_scores.csv"
+    steps = [
+        {
+            "name": "criticality",
+            "script": PRISM / "08_score_criticality.py",
+            "params": {"--embed_mode": args.crit_embed_mode},
+            "io": ["--input", str(input_csv), "--outdir", str(outdir)],
+            "out": crit_path,
+            "shard_by": None,
+        },
+        {
+            "name": "specificity",
+            "script": PRISM / "09_score_specificity.py",
+            "params": {},
+            "io": ["--input", str(input_csv), "--out_scores", str(spec_path),
+                   "--out_meta", str(outdir / "specificity_meta.csv")],
+            "out": spec_path,
+            "shard_by": "system",
+        },
+        {
+            "name": "volatility",
+            "script": PRISM / "10_score_volatility.py",
+            "params": {"--embed_mode": args.vol_embed_mode},
+            "io": ["--input", str(input_csv), "--out_scores", str(vol_path),
+                   "--out_meta", str(outdir / "volatility_meta.csv")],
+            "out": vol_path,
+            "shard_by": None,
+        },
+    ]
+    # shard_by: column whose groups a scorer normalizes within (None = the whole input, never sharded)
+    for step in steps:
+        step["cmd"] = ["python3", str(step["script"])] + step["io"] + [x for kv in step["params"].items() for x in kv]
+        step["stamp"] = outdir / f".{step['name']}.cache.json"
+    return steps
+
+
+def run_step(step, key, force):
+    label = step.get("label", step["name"])
+    if not force and step["out"].exists() and step["stamp"].exists():
+        stamp = json.loads(step["stamp"].read_text(encoding="utf-8"))
+        if stamp.get("key") == key:
+            log(f"SKIP: {label} up to date at {step['out']}")
+            return {"step": label, "skipped": True, "key": key}
+
+    log("RUN: " + " ".join(step["cmd"]))
+    stats = run_measured(step["cmd"])
+    stamp = {"key": key, "params": step["params"], **stats}
+    # The stamp is the checkpoint: written only once the step's output is complete
+    step["stamp"].write_text(json.dumps(stamp, indent=2), encoding="utf-8")
+    log(f"DONE: {label} in {stats['seconds']}s, peak RSS {stats['peak_rss_mb']} MB")
+    return {"step": label, "skipped": False, "key": key, **stats}
+
+
+def split_shards(input_csv, shard_root, shard_size, group_col):
+    """Write the input as <shard_root>/shard_NNNNN/input.csv, each shard holding whole `group_col`
+    groups (packed up to shard_size rows in order of first appearance; a larger group is a shard
+    of its own). Rows keep their input order within a shard."""
+    codes, _ = pd.factorize(read_table(input_csv, columns=[group_col])[group_col].fillna(""))
+    shard_of_group = np.empty(codes.max() + 1 if len(codes) else 0, dtype=np.int64)
+    shard, filled = 0, 0
+    for g, n in enumerate(np.bincount(codes)):
+        if filled and filled + n > shard_size:
+            shard, filled = shard + 1, 0
+        shard_of_group[g] = shard
+        filled += n
+    row_shard = shard_of_group[codes]
+    shard_dirs = [shard_root / f"shard_{i:05d}" for i in range(shard + 1 if len(codes) else 0)]
+    for d in shard_dirs:
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "input.csv.tmp").unlink(missing_ok=True)
+    start = 0
+    for chunk in iter_table_chunks(input_csv, shard_size):
+        ids = row_shard[start:start + len(chunk)]
+        start += len(chunk)
+        for i in np.unique(ids):
+            tmp = shard_dirs[i] / "input.csv.tmp"
+            chunk[ids == i].to_csv(tmp, mode="a", header=not tmp.exists(), index=False)
+    for d in shard_dirs:
+        # Same rows -> same bytes, so finished shards keep their cache keys on a rerun
+        os.replace(d / "input.csv.tmp", d / "input.csv")
+    return shard_dirs
+
+
+def concat_csv(parts, out_path):
+    """Concatenate CSV files with the same header (header written once)."""
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        for i, part in enumerate(parts):
+            with open(part, "rb") as f:
+                header = f.readline()
+                if i == 0:
+                    out.write(header)
+                while block := f.read(1 << 20):
+                    out.write(block)
+    os.replace(tmp, out_path)
+
+
+@instrument
 def main():
-    OUTDIR.mkdir(parents=True, exist_ok=True)
-
-    crit_path = OUTDIR / "criticality_scored.csv"
-    spec_path = OUTDIR / "specificity_scores.csv"
-    vol_path = OUTDIR / "volatility_scores.csv"
-
-    # 1) Criticality
-    if not crit_path.exists():
-        run([
-            "python3", str(PRISM / "08_score_criticality.py"),
-            "--input", str(INPUT_CSV),
-            "--outdir", str(OUTDIR),
-            "--embed_mode", "model",
-        ])
-    else:
-        print(f"SKIP: criticality already exists at {crit_path}")
-
-    # 2) Specificity
-    if not spec_path.exists():
-        run([
-            "python3", str(PRISM / "09_score_specificity.py"),
-            "--input", str(INPUT_CSV),
-            "--out_scores", str(spec_path),
-            "--out_meta", str(OUTDIR / "specificity_meta.csv"),
-        ])
-    else:
-        print(f"SKIP: specificity already exists at {spec_path}")
-
-    # 3) Volatility
-    if not vol_path.exists():
-        run([
-            "python3", str(PRISM / "10_score_volatility.py"),
-            "--input", str(INPUT_CSV),
-            "--out_scores", str(vol_path),
-            "--out_meta", str(OUTDIR / "volatility_meta.csv"),
-            "--embed_mode", "onfly",
-        ])
-    else:
-        print(f"SKIP: volatility already exists at {vol_path}")
+    ap = argparse.ArgumentParser(description="Run PRISM C/S/V scorers (parallel, content-addressed cache).")
+    ap.add_argument("--input", default=str(INPUT_CSV), help="PRISM input CSV (06a output)")
+    ap.add_argument("--outdir", default=str(OUTDIR), help="Directory for per-scorer outputs")
+    ap.add_argument("--final_out", default=str(FINAL_OUT), help="Merged issue_key,C,S,V output")
+    ap.add_argument("--workers", type=int, default=3, help="Scorers run concurrently (1 = sequential)")
+    ap.add_argument("--crit_embed_mode", default="model", help="--embed_mode for 08_score_criticality")
+    ap.add_argument("--vol_embed_mode", default="onfly", help="--embed_mode for 10_score_volatility")
+    ap.add_argument("--force", action="store_true", help="Ignore cached outputs and rerun every scorer")
+    ap.add_argument("--shard_size", type=int, default=0,
+                    help="Score group-normalized scorers in shards of whole groups of about this many rows "
+                         "(0 = whole input); whole-input scorers are never sharded")
+    args = ap.parse_args()
+
+    input_csv = Path(args.input)
+    outdir = Path(args.outdir)
+    final_out = Path(args.final_out)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    t0 = time.perf_counter()
+    input_hash = file_sha256(input_csv)
+
+    steps = build_steps(input_csv, outdir, args)
+
+    # Jobs: one per scorer, or one per (shard, scorer) with --shard_size for group-normalized scorers
+    jobs = []
+    shard_outs = {}  # step index -> its per-shard outputs, in shard order
+    n_shards = 0
+    by_col = {}
+    for i, step in enumerate(steps):
+        if args.shard_size > 0 and step["shard_by"] is not None:
+            by_col.setdefault(step["shard_by"], []).append(i)
+        else:
+            if args.shard_size > 0:
+                log(f"NOSHARD: {step['name']} normalizes over the whole input, scored unsharded")
+            jobs.append((step, cache_key(input_hash, step)))
+    for col, idx in by_col.items():
+        shard_dirs = split_shards(input_csv, outdir / "shards" / col, args.shard_size, col)
+        for d in shard_dirs:
+            shard_in = d / "input.csv"
+            shard_hash = file_sha256(shard_in)
+            shard_steps = build_steps(shard_in, d, args)
+            for i in idx:
+                step = shard_steps[i]
+                step["label"] = f"{step['name']}[{col}/{d.name}]"
+                jobs.append((step, cache_key(shard_hash, step)))
+                shard_outs.setdefault(i, []).append(step["out"])
+        n_shards += len(shard_dirs)
+        log(f"SHARDS: {len(shard_dirs)} of whole {col} groups "
+            f"(up to {args.shard_size} rows unless one group is larger)")
+
+    # 1-3) Criticality, Specificity, Volatility (independent; each scorer is its own process)
+    with phase("score"), ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(run_step, step, key, args.force) for step, key in jobs]
+        step_logs = [f.result() for f in futures]
+
+    for i, outs in shard_outs.items():
+        # Assemble the scorer's output from its shards (rows grouped by shard), no recomputation
+        concat_csv(outs, steps[i]["out"])
+        # A whole-input stamp must not vouch for an assembled output
+        steps[i]["stamp"].unlink(missing_ok=True)
+
+    crit_path, spec_path, vol_path = (step["out"] for step in steps)
 
     # 4) Merge scores (req_id → issue_key)
-    c = pd.read_csv(crit_path)
-    s = pd.read_csv(spec_path)
-    v = pd.read_csv(vol_path)
+    with phase("read"):
+        c = pd.read_csv(crit_path)
+        s = pd.read_csv(spec_path)
+        v = pd.read_csv(vol_path)
 
     c_col = pick_col(c, ["Criticality", "criticality", "C", "criticality_score"])
     s_col = pick_col(s, ["S_final_sys", "specificity", "S", "specificity_score"])
     v_col = pick_col(v, ["V_final", "volatility", "V", "volatility_score"])
 
-    merged = (
-        c[["req_id", c_col]].rename(columns={c_col: "C"})
-        .merge(s[["req_id", s_col]].rename(columns={s_col: "S"}), on="req_id", how="inner")
-        .merge(v[["req_id", v_col]].rename(columns={v_col: "V"}), on="req_id", how="inner")
-        .rename(columns={"req_id": "issue_key"})
-    )
+    merged = merge_on_key(c[["req_id", c_col]].rename(columns={c_col: "C"}),
+                          s[["req_id", s_col]].rename(columns={s_col: "S"}), on="req_id", how="inner")
+    merged = merge_on_key(merged, v[["req_id", v_col]].rename(columns={v_col: "V"}), on="req_id", how="inner")
+    merged = merged.rename(columns={"req_id": "issue_key"})
+
+    final_out.parent.mkdir(parents=True, exist_ok=True)
+    with phase("write"):
+        merged.to_csv(final_out, index=False)
+        sketch_out = save_sketches(final_out, build_sketches([merged]))
+    count_rows(rows_in=len(c), rows_out=len(merged))
 
-    merged.to_csv(FINAL_OUT, index=False)
+    run_log = {
+        "input": str(input_csv),
+        "input_sha256": input_hash,
+        "workers": args.workers,
+        "shards": n_shards,
+        "steps": step_logs,
+        "wall_seconds": round(time.perf_counter() - t0, 3),
+    }
+    (outdir / "scoring_run_log.json").write_text(json.dumps(run_log, indent=2), encoding="utf-8")
 
     print("OK")
-    print(f"Wrote final PRISM scores to: {FINAL_OUT}")
+    print(f"Wrote final PRISM scores to: {final_out}")
     print(f"Rows: {len(merged)}")
+    print(f"Quantile sketches: {sketch_out}")
+    print(f"Run log: {outdir / 'scoring_run_log.json'}")
 
 
 if __name__ == "__main__":
@@ -3,23 +3,43 @@ import argparse
 from pathlib import Path
 import pandas as pd
 
+from stage_metrics import count_rows, instrument, phase
+from table_io import read_table, write_table
+from text_store import TEXT_REF, TextStore, resolve_text
+
+def prepare_for_prism(df, system="airflow"):
+    df = df.copy()
+    # PRISM-required grouping columns
+    df["system"] = system
+    df["class"] = df["issue_type"].fillna("Unknown")
+    df["req_id"] = df["issue_key"]
+    df["source"] = f"jira_{system}"
+    return df
+
+@instrument
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--in_csv", required=True)
     ap.add_argument("--out_csv", required=True)
+    ap.add_argument("--system", default="airflow", help="PRISM system name (source becomes jira_<system>)")
+    ap.add_argument("--text_store", default=None, help="Text store (02 --text_store) to resolve a text_ref column")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.in_csv, dtype=str)
-
-    # PRISM-required grouping columns
-    df["system"] = "airflow"
-    df["class"] = df["issue_type"].fillna("Unknown")
-    df["req_id"] = df["issue_key"]
-    df["source"] = "jira_airflow"
+    with phase("read"):
+        df = read_table(args.in_csv)
+        # PRISM scorers read the text itself
+        if TEXT_REF in df.columns:
+            if not args.text_store:
+                raise ValueError(f"{args.in_csv} has {TEXT_REF} instead of text; pass --text_store")
+            df = resolve_text(df, TextStore(args.text_store))
+    df = prepare_for_prism(df, system=args.system)
+    count_rows(rows_in=len(df))
 
     out_path = Path(args.out_csv)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_path, index=False)
+    # PRISM scorers read CSV, so keep --out_csv as .csv when it feeds 06
+    with phase("write"):
+        write_table(df, out_path)
 
     print("OK")
     print(f"Wrote: {out_path}")
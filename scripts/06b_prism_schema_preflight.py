@@ -1,20 +1,47 @@
 #!/usr/bin/env python3
+"""
+Preflight of the PRISM input (06a output) before scoring.
+
+- Required columns for the 08/09/10 scorers from the header alone (no data rows are parsed)
+- Value checks on a leading sample (--sample_rows) or the whole file (--full), in one streaming
+  pass that stops at the first violation: ids/grouping columns present, priorities known to 03,
+  created_ts numeric (the same conditions 03 raises on)
+"""
 import argparse
-import pandas as pd
+
+from jira_export import DEFAULT_CHUNKSIZE
+from pipeline_stages import load_stage
+from stage_metrics import count_rows, instrument, phase
+from table_io import read_columns
+from validation import Allowed, NotNull, Numeric, print_report, validate
 
 REQ_08 = {"system", "class"}
 REQ_09 = {"req_id", "system", "class", "source"}
 REQ_10 = {"req_id", "system", "class"}
 
+
+def value_checks(cols):
+    checks = [NotNull(c) for c in ("req_id", "system", "class", "text") if c in cols]
+    if "priority" in cols:
+        checks.append(Allowed("priority", load_stage("03_priority_only_baseline").PRIORITY_ORDER))
+    if "created_ts" in cols:
+        checks.append(Numeric("created_ts"))
+    return checks
+
+
+@instrument
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--input", required=True)
+    ap.add_argument("--sample_rows", type=int, default=10_000, help="Leading rows value-checked (0 = header only)")
+    ap.add_argument("--full", action="store_true", help="Value-check every row (streaming)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
     args = ap.parse_args()
 
-    df = pd.read_csv(args.input, dtype=str)
-    cols = set(df.columns)
+    # Header/schema only: no data rows are parsed
+    cols = set(read_columns(args.input))
 
-    print("OK: loaded", len(df), "rows")
+    print("OK: read header with", len(cols), "columns")
     print("Missing for 08_score_criticality:", sorted(REQ_08 - cols))
     print("Missing for 09_score_specificity:", sorted(REQ_09 - cols))
     print("Missing for 10_score_volatility:", sorted(REQ_10 - cols))
@@ -22,5 +49,19 @@ def main():
     if (REQ_08 - cols) or (REQ_09 - cols) or (REQ_10 - cols):
         raise SystemExit(2)
 
+    if args.full or args.sample_rows > 0:
+        with phase("read"):
+            if args.full:
+                report = validate(args.input, value_checks(cols), args.chunksize)
+            else:
+                # One row past the sample tells a file of exactly --sample_rows rows from a longer one
+                report = validate(args.input, value_checks(cols), min(args.chunksize, args.sample_rows + 1),
+                                  max_rows=args.sample_rows)
+        count_rows(rows_in=report["rows_scanned"])
+        print_report(report)
+        if not report["ok"]:
+            raise SystemExit(2)
+        print("OK: value checks passed")
+
 if __name__ == "__main__":
     main()
@@ -1,34 +1,64 @@
 #!/usr/bin/env python3
-import pandas as pd
+"""
+Audit of the merged PRISM scores (06 --final_out).
+
+- Required columns from the header alone
+- One streaming pass (stops at the first violation): issue_key present, C/S/V numeric, no NaN,
+  within --range if given
+- C/S/V monotonic over the file (looks like a ranking, not readiness signals) is a warning;
+  --fail_monotonic makes it a failure. Constant columns and files under 3 rows are never monotonic
+"""
+import argparse
 import sys
 
+from jira_export import DEFAULT_CHUNKSIZE
+from stage_metrics import count_rows, instrument, phase
+from table_io import read_columns
+from validation import NotMonotonic, NotNull, Numeric, missing_columns, print_report, validate
+
 CSV = "data/processed/prism_scores_airflow.csv"
 
+@instrument
 def main():
-    df = pd.read_csv(CSV)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scores_csv", default=CSV, help="Merged PRISM scores (06 --final_out)")
+    ap.add_argument("--range", default=None, help="Allowed lo,hi for C/S/V (default: no range check)")
+    ap.add_argument("--fail_monotonic", action="store_true", help="Fail (not just warn) when C/S/V is monotonic")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = ap.parse_args()
 
-    print("Rows:", len(df))
-    print("Columns:", list(df.columns))
+    print("Columns:", read_columns(args.scores_csv))
 
     required = ["issue_key", "C", "S", "V"]
-    missing = [c for c in required if c not in df.columns]
+    missing = missing_columns(args.scores_csv, required)
     if missing:
         print("FAIL: missing columns:", missing)
         sys.exit(1)
 
-    print("\nNaN check:")
-    print(df[required].isna().sum())
+    lo, hi = (float(x) for x in args.range.split(",")) if args.range else (None, None)
+    signals = ["C", "S", "V"]
+    checks = ([NotNull("issue_key")] + [Numeric(c, lo, hi) for c in signals]
+              + [NotMonotonic(c, warn=not args.fail_monotonic) for c in signals])
+    with phase("read"):
+        report = validate(args.scores_csv, checks, args.chunksize)
+    count_rows(rows_in=report["rows_scanned"])
+    print_report(report)
+    if not report["ok"]:
+        sys.exit(1)
 
-    print("\nRange check:")
-    for c in ["C", "S", "V"]:
-        print(f"{c}: min={df[c].min():.4f}, max={df[c].max():.4f}")
+    print("\nRange check:" if args.range else "\nValue ranges:")
+    for c in signals:
+        r = report["summary"].get(f"Numeric:{c}")
+        print(f"{c}: min={r['min']:.4f}, max={r['max']:.4f}" if r else f"{c}: no values")
 
     print("\nMonotonicity check (should be FALSE):")
-    print("C monotonic:", df["C"].is_monotonic_decreasing or df["C"].is_monotonic_increasing)
-    print("S monotonic:", df["S"].is_monotonic_decreasing or df["S"].is_monotonic_increasing)
-    print("V monotonic:", df["V"].is_monotonic_decreasing or df["V"].is_monotonic_increasing)
+    for c in signals:
+        print(f"{c} monotonic:", report["summary"][f"NotMonotonic:{c}"]["monotonic"])
 
-    print("\nOK: audit passed — readiness signals only")
+    if report["warnings"]:
+        print(f"\nOK: audit passed with {len(report['warnings'])} warning(s)")
+    else:
+        print("\nOK: audit passed — readiness signals only")
 
 if __name__ == "__main__":
     main()
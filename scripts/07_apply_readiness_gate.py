@@ -4,113 +4,260 @@ Apply PRISM readiness gate to a priority-only baseline selection.
 
 - Does NOT re-rank or optimize priorities.
 - Preserves baseline order; only changes selection composition by deferring not-ready items.
+- Gates the max-K prefix once; every smaller Top-K is a prefix of it, so per-K sets and
+  reports are sliced from cumulative counts (O(max K) instead of O(sum of Ks)).
 - Supports:
   - LOCKED_GATE_V1: numeric thresholds (C_min, S_min, V_max)
   - LOCKED_GATE_V2: quantile thresholds (S_min_quantile, V_max_quantile) computed from scores scope
+    (--quantiles sketch: from the scores' quantile sketch, with its rank error in the report)
+- Several configs (--gate_cfg directory or comma-separated list): baseline, scores and the
+  prefix join are loaded once and, with --workers > 1, shared with a fork-based worker pool; each
+  config writes the same outputs as a single-config run into out_dir/<config name>/
 """
 
-import argparse, json
+import argparse, json, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from issue_index import KeyCodes, merge_on_key
+from jira_export import DEFAULT_CHUNKSIZE
+from quantile_sketch import score_sketches
+from readiness_gate import PrefixCounts, decode_reasons, gate_mask, gate_thresholds, load_gate_cfg, parse_ks
+from stage_metrics import count_rows, instrument, phase
+from table_io import TableWriter, read_head, read_table, write_table
+from text_store import TextStore, resolve_text
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--baseline_csv", required=True)
-    ap.add_argument("--scores_csv", required=True)
-    ap.add_argument("--out_dir", required=True)
-    ap.add_argument("--ks", default="50,100,250,500")
-    ap.add_argument("--gate_cfg", required=True)
-    args = ap.parse_args()
+SUFFIX = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+WRITE_BLOCK = DEFAULT_CHUNKSIZE
 
-    out_dir = Path(args.out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
 
-    base = pd.read_csv(args.baseline_csv, dtype=str)
-    scores = pd.read_csv(args.scores_csv, dtype=str)
+def join_prefix(base, scores, max_k, base_codes=None, score_codes=None):
+    """Scores merged onto the max-K prefix of `base` (C/S/V of `scores` are made numeric in place).
 
+    Returns (joined, base_pos); base_pos maps joined rows back to baseline rows. The join does not
+    depend on the gate config, so several configs can share it (gate_joined).
+    """
     # Ensure numeric
     for col in ["C", "S", "V"]:
         scores[col] = pd.to_numeric(scores[col], errors="coerce")
 
-    cfg = json.loads(Path(args.gate_cfg).read_text(encoding="utf-8"))
-    rule = cfg.get("rule", "LOCKED_GATE_V1")
+    prefix = base.head(max_k).copy()
+    prefix["_base_pos"] = np.arange(len(prefix))
+    joined = merge_on_key(prefix, scores, "issue_key", how="left", left_codes=base_codes, right_codes=score_codes)
+    return joined, joined.pop("_base_pos").to_numpy()
 
-    # Pre-compute quantile thresholds if needed (declared, not optimized)
-    S_q = None
-    V_q = None
-    if rule == "LOCKED_GATE_V2":
-        s_qp = float(cfg["S_min_quantile"])
-        v_qp = float(cfg["V_max_quantile"])
-        S_q = float(scores["S"].quantile(s_qp))
-        V_q = float(scores["V"].quantile(v_qp))
-
-    def gate_row(r):
-        reasons = []
-
-        if pd.isna(r["C"]) or pd.isna(r["S"]) or pd.isna(r["V"]):
-            return ["missing_scores"]
-
-        if rule == "LOCKED_GATE_V1":
-            if r["C"] < float(cfg.get("C_min", 0.0)):
-                reasons.append("low_C")
-            if r["S"] < float(cfg.get("S_min", 0.0)):
-                reasons.append("low_S")
-            if r["V"] > float(cfg.get("V_max", 1.0)):
-                reasons.append("high_V")
-
-        elif rule == "LOCKED_GATE_V2":
-            # Minimal admissibility: defer bottom-decile specificity and top-decile volatility
-            if r["S"] < S_q:
-                reasons.append("low_S_q")
-            if r["V"] > V_q:
-                reasons.append("high_V_q")
-
-        else:
-            raise ValueError(f"Unknown gate rule: {rule}")
-
-        return reasons
-
-    ks = [int(x) for x in args.ks.split(",") if x.strip()]
+
+def gate_joined(joined, base_pos, scores, cfg, sketches=None):
+    """Thresholds of `cfg` (over the `scores` scope) and its gate mask of a join_prefix result.
+
+    Returns a dict with the report thresholds, the joined prefix, its gate mask and base_pos.
+    """
+    # Pre-compute thresholds once (V2 quantiles are declared, not optimized)
+    rule = cfg.get("rule", "LOCKED_GATE_V1")
+    thresholds = gate_thresholds(cfg, scores, sketches)
     report_all = {"gate_rule": rule}
     if rule == "LOCKED_GATE_V2":
-        report_all["thresholds"] = {"S_q": S_q, "V_q": V_q, "S_min_quantile": cfg["S_min_quantile"], "V_max_quantile": cfg["V_max_quantile"]}
+        report_all["thresholds"] = {"S_q": thresholds["S_q"], "V_q": thresholds["V_q"], "S_min_quantile": cfg["S_min_quantile"], "V_max_quantile": cfg["V_max_quantile"]}
+        if sketches is not None:
+            report_all["thresholds"].update(quantile_mode="sketch", rank_error=thresholds["rank_error"])
 
-    for K in ks:
-        topk = base.head(K).copy()
+    mask = gate_mask(joined, cfg, thresholds)
+    return {"report_all": report_all, "joined": joined, "mask": mask, "base_pos": base_pos}
 
-        joined = topk.merge(scores, on="issue_key", how="left")
 
-        joined["gate_reasons"] = joined.apply(
-            lambda r: gate_row(r),
-            axis=1
-        )
-        joined["is_ready"] = joined["gate_reasons"].apply(lambda xs: len(xs) == 0)
+def gate_prefix(base, scores, cfg, max_k, sketches=None, base_codes=None, score_codes=None):
+    """join_prefix + gate_joined for one config."""
+    joined, base_pos = join_prefix(base, scores, max_k, base_codes, score_codes)
+    return gate_joined(joined, base_pos, scores, cfg, sketches)
 
-        ready = joined[joined["is_ready"]].copy()
-        deferred = joined[~joined["is_ready"]].copy()
 
-        out_csv = out_dir / f"topk_{K}_gated.csv"
-        ready.to_csv(out_csv, index=False)
+def ready_rows(joined, mask, rows, text_store=None):
+    """Gated-set rows `rows` of the joined prefix; reasons (and text, with a store) are resolved
+    only for rows written out."""
+    ready = joined.iloc[rows].copy()
+    ready["gate_reasons"] = decode_reasons(mask[rows])
+    ready["is_ready"] = True
+    return ready if text_store is None else resolve_text(ready, text_store)
 
-        # Report
-        reason_counts = pd.Series([x for xs in deferred["gate_reasons"] for x in xs]).value_counts().to_dict()
 
+def write_gated(out_dir, gated, n_base, ks, fmt="csv", reports_only=False, curve_csv=None, write=write_table,
+                text_store=None):
+    """Per-K gated sets and reports (plus the optional curve) from one gate_prefix result.
+
+    `write(df, path)` writes the gated tables (a caller may queue them instead); with `text_store`
+    a text_ref column of the baseline is resolved to text in them.
+    """
+    joined, mask, base_pos = gated["joined"], gated["mask"], gated["base_pos"]
+    report_all = dict(gated["report_all"])
+    is_ready = mask == 0
+    counts = PrefixCounts(mask)
+    max_k = max(ks)
+
+    for K in ks:
+        baseline_count = min(K, n_base)
+        n = int(np.searchsorted(base_pos, baseline_count, side="left"))
+
+        out_csv = out_dir / f"topk_{K}_gated{SUFFIX[fmt]}"
+        if not reports_only:
+            rows = np.flatnonzero(is_ready[:n])
+            with phase("write"):
+                if write is write_table:
+                    # In blocks, so a large K never holds a second full copy of the prefix
+                    with TableWriter(out_csv) as w:
+                        for start in range(0, max(len(rows), 1), WRITE_BLOCK):
+                            w.write(ready_rows(joined, mask, rows[start:start + WRITE_BLOCK], text_store))
+                else:
+                    write(ready_rows(joined, mask, rows, text_store), out_csv)
+
+        # Report
         report = {
             "K": K,
-            "baseline_count": int(len(topk)),
-            "ready_count": int(len(ready)),
-            "deferred_count": int(len(deferred)),
-            "deferred_rate": float(len(deferred)) / float(len(topk)) if len(topk) else 0.0,
-            "deferred_reason_counts": reason_counts,
+            "baseline_count": int(baseline_count),
+            "ready_count": counts.ready(n),
+            "deferred_count": counts.deferred(n),
+            "deferred_rate": float(counts.deferred(n)) / float(baseline_count) if baseline_count else 0.0,
+            "deferred_reason_counts": counts.reason_counts(n),
         }
         report_all[str(K)] = report
 
         (out_dir / f"gate_report_topk_{K}.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
-        print(f"OK K={K}: ready={report['ready_count']} deferred={report['deferred_count']} wrote {out_csv}")
+        if not reports_only:
+            print(f"OK K={K}: ready={report['ready_count']} deferred={report['deferred_count']} wrote {out_csv}")
+
+    if curve_csv:
+        # Every K up to max K, straight from the cumulative counts
+        curve_k = np.arange(1, min(max_k, n_base) + 1)
+        curve_n = np.searchsorted(base_pos, curve_k, side="left")
+        curve = pd.DataFrame({
+            "K": curve_k,
+            "ready_count": counts.ready_cum[curve_n],
+            "deferred_count": curve_n - counts.ready_cum[curve_n],
+        })
+        curve["deferred_rate"] = curve["deferred_count"] / curve["K"]
+        for r, cum in counts.reason_cum.items():
+            if cum[-1]:
+                curve[r] = cum[curve_n]
+        Path(curve_csv).parent.mkdir(parents=True, exist_ok=True)
+        curve.to_csv(curve_csv, index=False)
+        print("OK wrote:", curve_csv)
 
     (out_dir / "gate_report_all.json").write_text(json.dumps(report_all, indent=2), encoding="utf-8")
     print("OK wrote:", out_dir / "gate_report_all.json")
+    return report_all
+
+
+def gate_cfg_paths(spec):
+    """--gate_cfg: one config file, a directory of *.json configs, or a comma-separated list of files."""
+    path = Path(spec)
+    if path.is_dir():
+        paths = sorted(path.glob("*.json"))
+        if not paths:
+            raise ValueError(f"No *.json gate configs in {path}")
+    else:
+        paths = [Path(p.strip()) for p in spec.split(",") if p.strip()]
+    names = [p.stem for p in paths]
+    dup = sorted({n for n in names if names.count(n) > 1})
+    if dup:
+        raise ValueError(f"Gate configs must have distinct file names (output subdirectories): {dup}")
+    return paths
+
+
+# Loaded once by the parent and inherited by forked workers (copy-on-write, nothing is pickled)
+_SHARED = {}
+
+
+def _gate_one(cfg_path):
+    sh = _SHARED
+    cfg = load_gate_cfg(cfg_path)
+    sketches = sh["sketches"] if cfg.get("rule") == "LOCKED_GATE_V2" else None
+    gated = gate_joined(sh["joined"], sh["base_pos"], sh["scores"], cfg, sketches)
+    out_dir = sh["out_dir"] / cfg_path.stem
+    out_dir.mkdir(parents=True, exist_ok=True)
+    curve_csv = out_dir / Path(sh["curve_csv"]).name if sh["curve_csv"] else None
+    return write_gated(out_dir, gated, sh["n_base"], sh["ks"], sh["fmt"], sh["reports_only"], curve_csv,
+                       text_store=sh["text_store"])
+
+
+def gate_many(cfg_paths, workers):
+    """Evaluate configs over _SHARED in a fork-based pool (sequentially without fork or with 1 worker)."""
+    workers = min(workers, len(cfg_paths))
+    if workers > 1:
+        try:
+            ctx = multiprocessing.get_context("fork")
+        except ValueError:
+            ctx = None
+        if ctx is not None:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                return list(pool.map(_gate_one, cfg_paths))
+    return [_gate_one(p) for p in cfg_paths]
+
+
+@instrument
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--baseline_csv", required=True)
+    ap.add_argument("--scores_csv", required=True)
+    ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--ks", default="50,100,250,500", help="Comma-separated K values or start:stop:step ranges")
+    ap.add_argument("--gate_cfg", required=True,
+                    help="Gate config; a directory of configs or a comma-separated list gates each one into out_dir/<name>/")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Configs evaluated concurrently in forked workers (default 1 = sequential); "
+                         "each worker holds its own gated sets, so peak memory grows with the worker count")
+    ap.add_argument("--format", default="csv", choices=sorted(SUFFIX), help="Output format for gated sets")
+    ap.add_argument("--reports_only", action="store_true", help="Skip writing per-K gated sets (curves/sweeps)")
+    ap.add_argument("--quantiles", default="exact", choices=["exact", "sketch"],
+                    help="V2 thresholds: exact quantiles (paper numbers) or the scores' quantile sketch")
+    ap.add_argument("--curve_csv", default=None, help="Optional per-K curve (K=1..max K) of ready/deferred/reason counts")
+    ap.add_argument("--text_store", default=None,
+                    help="Text store (02 --text_store): gated sets get text instead of the baseline's text_ref")
+    ap.add_argument("--key_cache", default=None, help="Optional directory caching the scores' integer key index")
+    args = ap.parse_args()
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    ks = parse_ks(args.ks)
+    max_k = max(ks)
+    with phase("read"):
+        # Only the max-K prefix is gated: the rest of the baseline is needed for its keys alone
+        base_keys = read_table(args.baseline_csv, columns=["issue_key"])["issue_key"]
+        base = read_head(args.baseline_csv, max_k)
+        scores = read_table(args.scores_csv)
+    n_base = len(base_keys)
+    count_rows(rows_in=n_base)
+
+    text_store = TextStore(args.text_store) if args.text_store else None
+    cfg_paths = gate_cfg_paths(args.gate_cfg)
+    cfgs = [load_gate_cfg(p) for p in cfg_paths]
+    sketches = None
+    if args.quantiles == "sketch" and any(c.get("rule") == "LOCKED_GATE_V2" for c in cfgs):
+        sketches = score_sketches(args.scores_csv, DEFAULT_CHUNKSIZE)
+
+    with phase("compute"):
+        # Integer-coded keys instead of hashing issue_key strings; only the prefix keys are coded
+        base_codes = KeyCodes.from_keys(base["issue_key"])
+        score_codes = KeyCodes.for_table(args.scores_csv, scores["issue_key"], cache_dir=args.key_cache)
+        joined, base_pos = join_prefix(base, scores, max_k, base_codes, score_codes)
+
+    if len(cfg_paths) == 1 and not Path(args.gate_cfg).is_dir():
+        gated = gate_joined(joined, base_pos, scores, cfgs[0], sketches if cfgs[0].get("rule") == "LOCKED_GATE_V2" else None)
+        write_gated(out_dir, gated, n_base, ks, args.format, args.reports_only, args.curve_csv, text_store=text_store)
+        return
+
+    # Several configs: the baseline, scores and join are shared; each config writes out_dir/<name>/
+    _SHARED.update(joined=joined, base_pos=base_pos, scores=scores, sketches=sketches, out_dir=out_dir,
+                   n_base=n_base, ks=ks, fmt=args.format, reports_only=args.reports_only, curve_csv=args.curve_csv,
+                   text_store=text_store)
+    del base, base_keys
+    with phase("compute"):
+        reports = gate_many(cfg_paths, args.workers)
+    summary = {p.stem: r for p, r in zip(cfg_paths, reports)}
+    (out_dir / "gate_report_configs.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print(f"OK gated {len(cfg_paths)} configs")
+    print("OK wrote:", out_dir / "gate_report_configs.json")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Resident readiness-gate service (same gate logic as 07, answered from memory).
+
+- Loads the priority-only baseline, PRISM C/S/V scores and gate config once
+- Pre-gates the whole baseline; Top-K answers are prefix slices (see 07)
+- POST /reload swaps in freshly loaded data atomically (queries keep using the old snapshot until then)
+- Duplicate issue_key rows in the baseline or scores are rejected at load; k must be in 1..baseline rows
+  and a malformed request is answered with 400
+
+Endpoints (JSON):
+  GET  /health
+  GET  /gate?k=50[&rows=1]          -> same report as gate_report_topk_K.json (+ ready/deferred keys)
+  GET  /explain?issue_key=AIRFLOW-56 -> rank, C/S/V, thresholds and deferral reasons for one issue
+  POST /whatif  {"gate_cfg": {...}, "k": 50}
+  POST /reload  {"baseline_csv": ..., "scores_csv": ..., "gate_cfg": ...}  (all optional)
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from issue_index import KeyCodes, merge_on_key
+from readiness_gate import PrefixCounts, decode_reasons, gate_mask, gate_thresholds, load_gate_cfg
+from table_io import read_table
+
+
+class GateSnapshot:
+    """Immutable, fully gated view of one (baseline, scores, gate_cfg) triple."""
+
+    def __init__(self, baseline_csv, scores_csv, gate_cfg, key_cache=None):
+        t0 = time.perf_counter()
+        self.paths = {"baseline_csv": str(baseline_csv), "scores_csv": str(scores_csv), "gate_cfg": str(gate_cfg)}
+        self.cfg = load_gate_cfg(gate_cfg)
+        self.rule = self.cfg.get("rule", "LOCKED_GATE_V1")
+
+        base = read_table(baseline_csv, columns=["issue_key"])
+        scores = read_table(scores_csv)
+        # One row per issue on both sides, so /explain and the Top-K counts are unambiguous
+        for side, keys in (("baseline", base["issue_key"]), ("scores", scores["issue_key"])):
+            dup = keys[keys.duplicated()]
+            if len(dup):
+                raise ValueError(f"Duplicate issue_key in the {side}; the gate needs one row per issue. "
+                                 f"Example keys: {dup.head(20).tolist()}")
+        for col in ["C", "S", "V"]:
+            scores[col] = pd.to_numeric(scores[col], errors="coerce")
+        self.scores = scores
+        self.thresholds = gate_thresholds(self.cfg, scores)
+
+        base["_base_pos"] = np.arange(len(base))
+        joined = merge_on_key(base, scores[["issue_key", "C", "S", "V"]], "issue_key", how="left",
+                              left_codes=KeyCodes.for_table(baseline_csv, base["issue_key"], cache_dir=key_cache),
+                              right_codes=KeyCodes.for_table(scores_csv, scores["issue_key"], cache_dir=key_cache))
+        self.n_base = len(base)
+        self.base_pos = joined.pop("_base_pos").to_numpy()
+        self.joined = joined
+        self.mask = gate_mask(joined, self.cfg, self.thresholds)
+        self.counts = PrefixCounts(self.mask)
+        self.position = {k: i for i, k in enumerate(joined["issue_key"].tolist())}
+        self.load_seconds = round(time.perf_counter() - t0, 3)
+
+    def check_k(self, k):
+        try:
+            k = int(k)
+        except (TypeError, ValueError):
+            raise ValueError(f"k must be an integer, got {k!r}") from None
+        if not 1 <= k <= self.n_base:
+            raise ValueError(f"k must be between 1 and {self.n_base} (baseline rows), got {k}")
+        return k
+
+    def prefix_rows(self, k):
+        baseline_count = min(k, self.n_base)
+        return baseline_count, int(np.searchsorted(self.base_pos, baseline_count, side="left"))
+
+    def gate(self, k, rows=False):
+        baseline_count, n = self.prefix_rows(k)
+        report = _report(k, baseline_count, self.counts, n)
+        if rows:
+            keys = self.joined["issue_key"].to_numpy()[:n]
+            mask = self.mask[:n]
+            report["ready_issue_keys"] = keys[mask == 0].tolist()
+            report["deferred"] = [
+                {"issue_key": key, "gate_reasons": reasons}
+                for key, reasons in zip(keys[mask != 0].tolist(), decode_reasons(mask[mask != 0]))
+            ]
+        return report
+
+    def explain(self, issue_key):
+        i = self.position.get(issue_key)
+        if i is None:
+            return None
+        row = self.joined.iloc[i]
+        reasons = decode_reasons(self.mask[i:i + 1])[0]
+        return {
+            "issue_key": issue_key,
+            "rank_priority_only": int(self.base_pos[i]) + 1,
+            "C": _num(row["C"]),
+            "S": _num(row["S"]),
+            "V": _num(row["V"]),
+            "gate_rule": self.rule,
+            "thresholds": self.thresholds,
+            "is_ready": not reasons,
+            "gate_reasons": reasons,
+        }
+
+    def whatif(self, cfg, k):
+        """Gate the Top-K prefix under another config (thresholds from the same scores scope)."""
+        if not isinstance(cfg, dict):
+            raise ValueError(f"gate_cfg must be a JSON object, got {type(cfg).__name__}")
+        k = self.check_k(k)
+        thresholds = gate_thresholds(cfg, self.scores)
+        baseline_count, n = self.prefix_rows(k)
+        mask = gate_mask(self.joined.iloc[:n], cfg, thresholds)
+        report = _report(k, baseline_count, PrefixCounts(mask), n)
+        report["gate_rule"] = cfg.get("rule", "LOCKED_GATE_V1")
+        report["thresholds"] = thresholds
+        return report
+
+
+def _num(x):
+    return None if pd.isna(x) else float(x)
+
+
+def _report(k, baseline_count, counts, n):
+    return {
+        "K": k,
+        "baseline_count": int(baseline_count),
+        "ready_count": counts.ready(n),
+        "deferred_count": counts.deferred(n),
+        "deferred_rate": float(counts.deferred(n)) / float(baseline_count) if baseline_count else 0.0,
+        "deferred_reason_counts": counts.reason_counts(n),
+    }
+
+
+class GateService:
+    def __init__(self, baseline_csv, scores_csv, gate_cfg, key_cache=None):
+        self.key_cache = key_cache
+        self._snapshot = GateSnapshot(baseline_csv, scores_csv, gate_cfg, key_cache)
+        self._reload_lock = threading.Lock()
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def reload(self, baseline_csv=None, scores_csv=None, gate_cfg=None):
+        with self._reload_lock:
+            old = self._snapshot.paths
+            new = GateSnapshot(
+                baseline_csv or old["baseline_csv"],
+                scores_csv or old["scores_csv"],
+                gate_cfg or old["gate_cfg"],
+                self.key_cache,
+            )
+            # Single reference swap: in-flight queries finish on the snapshot they started with
+            self._snapshot = new
+        return new
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, payload):
+            body = json.dumps(payload, indent=2).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("request body must be a JSON object")
+            return body
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            q = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            snap = service.snapshot
+            try:
+                if url.path == "/health":
+                    self._send(200, {"status": "ok", "rows": snap.n_base, "gate_rule": snap.rule,
+                                     "load_seconds": snap.load_seconds, **snap.paths})
+                elif url.path == "/gate":
+                    k = snap.check_k(q.get("k", min(500, snap.n_base)))
+                    self._send(200, snap.gate(k, rows=q.get("rows") in ("1", "true")))
+                elif url.path == "/explain":
+                    out = snap.explain(q.get("issue_key", ""))
+                    if out is None:
+                        self._send(404, {"error": f"issue_key not in baseline: {q.get('issue_key')}"})
+                    else:
+                        self._send(200, out)
+                else:
+                    self._send(404, {"error": f"unknown endpoint {url.path}"})
+            except (KeyError, ValueError) as e:
+                self._send(400, {"error": str(e)})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            try:
+                body = self._body()
+                if url.path == "/whatif":
+                    snap = service.snapshot
+                    self._send(200, snap.whatif(body["gate_cfg"], body.get("k", min(500, snap.n_base))))
+                elif url.path == "/reload":
+                    snap = service.reload(body.get("baseline_csv"), body.get("scores_csv"), body.get("gate_cfg"))
+                    self._send(200, {"status": "reloaded", "rows": snap.n_base, "load_seconds": snap.load_seconds})
+                else:
+                    self._send(404, {"error": f"unknown endpoint {url.path}"})
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                self._send(400, {"error": str(e)})
+
+        def log_message(self, fmt, *args):
+            if not self.server.quiet:
+                super().log_message(fmt, *args)
+
+    return Handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve readiness-gate queries from memory.")
+    ap.add_argument("--baseline_csv", required=True)
+    ap.add_argument("--scores_csv", required=True)
+    ap.add_argument("--gate_cfg", required=True)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--quiet", action="store_true", help="No per-request access log")
+    ap.add_argument("--key_cache", default=None, help="Optional directory caching the integer key index of each input")
+    args = ap.parse_args()
+
+    service = GateService(args.baseline_csv, args.scores_csv, args.gate_cfg, args.key_cache)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.quiet = args.quiet
+    print(f"OK loaded {service.snapshot.n_base} rows in {service.snapshot.load_seconds}s")
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
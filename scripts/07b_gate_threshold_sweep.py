@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Threshold sweep / what-if analysis for the readiness gate (no outputs other than the sweep tables).
+
+- LOCKED_GATE_V2: grids of S_min_quantile x V_max_quantile (quantiles over the scores scope, as in 07)
+- LOCKED_GATE_V1: grids of C_min x S_min x V_max
+- Any list of K values (each Top-K is a prefix of the baseline, as in 07)
+
+Scores are merged and bucketed once. For each K the bucket histogram over the whole threshold
+grid is turned into ready counts with cumulative sums, so the cost is O(max K + |Ks| x grid)
+instead of re-gating every (K, config) pair.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from issue_index import KeyCodes, merge_on_key
+from readiness_gate import parse_ks
+from table_io import read_table
+
+
+def parse_grid(spec):
+    """Comma-separated floats; an entry "start:stop:step" expands to an inclusive range."""
+    vals = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            start, stop, step = (float(x) for x in part.split(":"))
+            n = int(round((stop - start) / step)) + 1
+            vals.extend(np.round(start + step * np.arange(n), 10).tolist())
+        else:
+            vals.append(float(part))
+    return vals
+
+
+class Dim:
+    """One gated score with a grid of thresholds. kind="low": defer if value < t; "high": defer if value > t."""
+
+    def __init__(self, reason, values, thresholds, kind):
+        self.reason = reason
+        self.kind = kind
+        self.thresholds = np.asarray(thresholds, dtype="float64")
+        self.order = np.argsort(self.thresholds, kind="mergesort")
+        self.sorted = self.thresholds[self.order]
+        side = "right" if kind == "low" else "left"
+        # bucket = number of (sorted) thresholds <= value (low) / < value (high)
+        self.bucket = np.searchsorted(self.sorted, values, side=side)
+
+    @property
+    def m(self):
+        return len(self.sorted)
+
+    def ok_from_hist(self, hist, axis):
+        """Along `axis` (length m+1): #rows not deferred for each sorted threshold j."""
+        if self.kind == "low":
+            # ok iff bucket > j  ->  reverse cumulative sum, shifted by one
+            rev = np.flip(np.cumsum(np.flip(hist, axis=axis), axis=axis), axis=axis)
+            return np.take(rev, np.arange(1, self.m + 1), axis=axis)
+        # ok iff bucket <= j
+        return np.take(np.cumsum(hist, axis=axis), np.arange(self.m), axis=axis)
+
+
+def sweep(missing, dims, base_pos, n_base, ks):
+    """Yield (K, baseline_count, rows, missing_count, ready[grid], reason_counts{reason: [m]}) per K."""
+    shape = tuple(d.m + 1 for d in dims)
+    hist = np.zeros(int(np.prod(shape)), dtype=np.int64)
+    flat = np.ravel_multi_index(tuple(d.bucket for d in dims), shape) if len(missing) else np.zeros(0, dtype=np.int64)
+    done = 0
+    n_missing = 0
+    for K in sorted(set(ks)):
+        baseline_count = min(K, n_base)
+        n = int(np.searchsorted(base_pos, baseline_count, side="left"))
+        seg = slice(done, n)
+        ok_rows = ~missing[seg]
+        hist += np.bincount(flat[seg][ok_rows], minlength=len(hist))
+        n_missing += int((~ok_rows).sum())
+        done = n
+
+        ready = hist.reshape(shape)
+        for axis, d in enumerate(dims):
+            ready = d.ok_from_hist(ready, axis)
+        scored = n - n_missing
+        reasons = {}
+        for axis, d in enumerate(dims):
+            marginal = hist.reshape(shape).sum(axis=tuple(a for a in range(len(dims)) if a != axis))
+            reasons[d.reason] = scored - d.ok_from_hist(marginal, 0)
+        yield K, baseline_count, n, n_missing, ready, reasons
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sweep gate thresholds x K and report deferred rates.")
+    ap.add_argument("--baseline_csv", required=True)
+    ap.add_argument("--scores_csv", required=True)
+    ap.add_argument("--out_csv", required=True, help="Long-form sweep table (one row per K x threshold point)")
+    ap.add_argument("--out_report", default=None, help="Optional JSON summary")
+    ap.add_argument("--ks", default="50,100,250,500", help="Comma-separated K values or start:stop:step ranges")
+    ap.add_argument("--rule", default="LOCKED_GATE_V2", choices=["LOCKED_GATE_V1", "LOCKED_GATE_V2"])
+    ap.add_argument("--S_min_quantile", default="0.05:0.25:0.05", help="V2 grid (floats or start:stop:step)")
+    ap.add_argument("--V_max_quantile", default="0.75:0.95:0.05", help="V2 grid")
+    ap.add_argument("--C_min", default="0.0", help="V1 grid")
+    ap.add_argument("--S_min", default="0.0", help="V1 grid")
+    ap.add_argument("--V_max", default="1.0", help="V1 grid")
+    ap.add_argument("--key_cache", default=None, help="Optional directory caching the scores' integer key index")
+    args = ap.parse_args()
+
+    base = read_table(args.baseline_csv, columns=["issue_key"])
+    scores = read_table(args.scores_csv)
+    for col in ["C", "S", "V"]:
+        scores[col] = pd.to_numeric(scores[col], errors="coerce")
+
+    ks = parse_ks(args.ks)
+    prefix = base.head(max(ks)).copy()
+    prefix["_base_pos"] = np.arange(len(prefix))
+    joined = merge_on_key(prefix, scores[["issue_key", "C", "S", "V"]], "issue_key", how="left",
+                          left_codes=KeyCodes.from_keys(prefix["issue_key"]),
+                          right_codes=KeyCodes.for_table(args.scores_csv, scores["issue_key"], cache_dir=args.key_cache))
+    base_pos = joined["_base_pos"].to_numpy()
+    C, S, V = (joined[c].to_numpy(dtype="float64", na_value=np.nan) for c in ["C", "S", "V"])
+    missing = np.isnan(C) | np.isnan(S) | np.isnan(V)
+
+    # Grid axes: (parameter name, parameter values, resolved thresholds)
+    if args.rule == "LOCKED_GATE_V2":
+        s_qp = parse_grid(args.S_min_quantile)
+        v_qp = parse_grid(args.V_max_quantile)
+        # Same per-point values as 07 (scores["S"].quantile(q)); the scores are sorted once
+        s_q = [float(x) for x in scores["S"].quantile(s_qp)]
+        v_q = [float(x) for x in scores["V"].quantile(v_qp)]
+        dims = [Dim("low_S_q", S, s_q, "low"), Dim("high_V_q", V, v_q, "high")]
+        axes = [("S_min_quantile", s_qp, "S_q", s_q), ("V_max_quantile", v_qp, "V_q", v_q)]
+    else:
+        c_min, s_min, v_max = parse_grid(args.C_min), parse_grid(args.S_min), parse_grid(args.V_max)
+        dims = [Dim("low_C", C, c_min, "low"), Dim("low_S", S, s_min, "low"), Dim("high_V", V, v_max, "high")]
+        axes = [("C_min", c_min, None, None), ("S_min", s_min, None, None), ("V_max", v_max, None, None)]
+
+    # Sorted-grid index -> original parameter index, per axis
+    sorted_pos = np.indices([d.m for d in dims]).reshape(len(dims), -1).T
+    orig_idx = np.stack([d.order[sorted_pos[:, a]] for a, d in enumerate(dims)], axis=1)
+
+    frames = []
+    for K, baseline_count, n, n_missing, ready, reasons in sweep(missing, dims, base_pos, len(base), ks):
+        out = {"K": K, "baseline_count": baseline_count}
+        for a, (name, params, tname, tvals) in enumerate(axes):
+            out[name] = np.asarray(params)[orig_idx[:, a]]
+            if tname:
+                out[tname] = np.asarray(tvals)[orig_idx[:, a]]
+        ready_flat = ready.reshape(-1)
+        out["ready_count"] = ready_flat
+        out["deferred_count"] = n - ready_flat
+        out["deferred_rate"] = (n - ready_flat) / baseline_count if baseline_count else 0.0
+        out["missing_scores"] = n_missing
+        for a, d in enumerate(dims):
+            out[d.reason] = reasons[d.reason][sorted_pos[:, a]]
+        frames.append(pd.DataFrame(out))
+
+    table = pd.concat(frames, ignore_index=True)
+    key_cols = [name for name, *_ in axes]
+    table = table.sort_values(["K"] + key_cols, kind="mergesort").reset_index(drop=True)
+
+    out_csv = Path(args.out_csv)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    table.to_csv(out_csv, index=False)
+
+    if args.out_report:
+        report = {
+            "gate_rule": args.rule,
+            "ks": sorted(set(ks)),
+            "grid": {name: list(map(float, params)) for name, params, *_ in axes},
+            "points": int(len(table)),
+        }
+        Path(args.out_report).write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print("OK")
+    print(f"Points: {len(table)} (Ks={len(set(ks))} x grid={len(sorted_pos)})")
+    print(f"Wrote: {out_csv}")
+
+
+if __name__ == "__main__":
+    main()
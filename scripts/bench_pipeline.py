@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark: time and memory-profile each stage on synthetic exports.
+
+- Generates (or reuses) a synthetic export per size with bench_synthetic_export.py
+- Runs 01 load, 02 text, 03 rank, 04 freeze, 07 gate as separate processes, recording
+  wall time, peak RSS of the stage process and rows/second
+- Writes machine-readable results (JSON); --compare flags stages slower than a previous run
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_synthetic_export import generate, parse_rows
+from pipeline_stages import SCRIPTS
+from stage_metrics import run_measured
+from table_io import read_head
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=SCRIPTS, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synth_scores(baseline_csv, out_csv, max_k, seed):
+    """Random C/S/V for the Top-K scope (stands in for 06, which needs the PRISM submodule)."""
+    keys = read_head(baseline_csv, max_k, columns=["issue_key"])["issue_key"]
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        "issue_key": keys,
+        "C": rng.random(len(keys)).round(4),
+        "S": rng.random(len(keys)).round(4),
+        "V": rng.random(len(keys)).round(4),
+    }).to_csv(out_csv, index=False)
+
+
+def bench_size(rows, work, args):
+    py = sys.executable
+    export = work / f"synthetic_{rows}.csv"
+    if not export.exists():
+        t0 = time.perf_counter()
+        generate(export, rows, seed=args.seed)
+        print(f"GEN {rows} rows in {time.perf_counter() - t0:.1f}s")
+
+    d = work / f"run_{rows}"
+    d.mkdir(parents=True, exist_ok=True)
+    gate_cfg = Path(args.gate_cfg).resolve()
+    stages = [
+        ("01_load", [py, str(SCRIPTS / "01_load_and_parse.py"), "--in", str(export), "--out_dir", str(d / "01")]),
+        ("02_text", [py, str(SCRIPTS / "02_text_construction.py"), "--in", str(export),
+                     "--out_csv", str(d / "processed.csv"), "--out_report", str(d / "02.json")]),
+        ("03_rank", [py, str(SCRIPTS / "03_priority_only_baseline.py"), "--in_csv", str(d / "processed.csv"),
+                     "--out_csv", str(d / "baseline.csv"), "--out_report", str(d / "03.json")]),
+        ("04_freeze", [py, str(SCRIPTS / "04_freeze_topk_sets.py"), "--in_csv", str(d / "baseline.csv"),
+                       "--out_dir", str(d / "topk"), "--ks", args.ks]),
+        ("07_gate", [py, str(SCRIPTS / "07_apply_readiness_gate.py"), "--baseline_csv", str(d / "baseline.csv"),
+                     "--scores_csv", str(d / "scores.csv"), "--out_dir", str(d / "gated"), "--ks", args.ks,
+                     "--gate_cfg", str(gate_cfg)]),
+    ]
+    results = []
+    for name, cmd in stages:
+        if name == "07_gate":
+            synth_scores(d / "baseline.csv", d / "scores.csv", max(int(k) for k in args.ks.split(",")), args.seed)
+        best = None
+        for _ in range(args.repeat):
+            with open(d / f"{name}.log", "w", encoding="utf-8") as log:
+                log.write("RUN: " + " ".join(cmd) + "\n")
+                log.flush()
+                stats = run_measured(cmd, stdout=log, stderr=subprocess.STDOUT)
+            if best is None or stats["seconds"] < best["seconds"]:
+                best = stats
+        results.append({
+            "rows": rows,
+            "stage": name,
+            "seconds": best["seconds"],
+            "peak_rss_mb": best["peak_rss_mb"],
+            "rows_per_sec": round(rows / best["seconds"], 1) if best["seconds"] else None,
+        })
+        print(f"{rows:>10} {name:<10} {best['seconds']:>9.3f}s {best['peak_rss_mb']:>9.1f} MB")
+    return results
+
+
+def compare(results, previous, tolerance):
+    """Stages whose time grew by more than `tolerance` (fraction) vs a previous results file."""
+    prev = {(r["rows"], r["stage"]): r for r in previous["results"]}
+    regressions = []
+    for r in results:
+        p = prev.get((r["rows"], r["stage"]))
+        if p and p["seconds"] > 0 and r["seconds"] > p["seconds"] * (1 + tolerance):
+            regressions.append({**r, "previous_seconds": p["seconds"],
+                                "slowdown": round(r["seconds"] / p["seconds"], 3)})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark pipeline stages on synthetic Jira exports.")
+    ap.add_argument("--sizes", default="10k,100k", help="Comma-separated row counts, e.g. 10k,100k,1M,10M")
+    ap.add_argument("--work_dir", default="bench_work", help="Synthetic exports and stage outputs (reused)")
+    ap.add_argument("--out_json", default="outputs/logs/bench_results.json")
+    ap.add_argument("--gate_cfg", default=str(SCRIPTS.parent / "outputs" / "logs" / "gate_cfg.json"))
+    ap.add_argument("--ks", default="50,100,250,500")
+    ap.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is reported")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--compare", default=None, help="Previous results JSON to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = ap.parse_args()
+
+    work = Path(args.work_dir)
+    work.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for size in args.sizes.split(","):
+        results.extend(bench_size(parse_rows(size), work, args))
+
+    out = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "git_commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.compare:
+        out["regressions"] = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.tolerance)
+
+    out_json = Path(args.out_json)
+    out_json.parent.mkdir(parents=True, exist_ok=True)
+    out_json.write_text(json.dumps(out, indent=2), encoding="utf-8")
+    print("OK wrote:", out_json)
+
+    if out.get("regressions"):
+        for r in out["regressions"]:
+            print(f"REGRESSION {r['rows']} {r['stage']}: {r['previous_seconds']}s -> {r['seconds']}s")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
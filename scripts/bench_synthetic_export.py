@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Synthetic Jira export generator for benchmarks (same headerless schema as the Airflow export).
+
+Reproduces the pathologies the real export has:
+- embedded newlines, tabs, quotes and commas inside quoted summary/description fields
+- heavy-tailed text length (most issues short, a few with 100k+ characters)
+- skewed priority distribution (Major/Minor dominate, as in 03_priority_only_report.json)
+- some missing summaries/descriptions and a small share of duplicate issue keys
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from jira_export import COLS
+
+
+# Airflow shares (03_priority_only_report.json), rounded
+PRIORITIES = ["Major", "Minor", "Trivial", "Critical", "Blocker"]
+PRIORITY_P = [0.567, 0.306, 0.072, 0.032, 0.023]
+ISSUE_TYPES = ["Bug", "Improvement", "New Feature", "Task", "Sub-task", "Wish"]
+ISSUE_TYPE_P = [0.45, 0.30, 0.12, 0.08, 0.04, 0.01]
+STATUSES = ["Closed", "Resolved", "Open", "In Progress", "Reopened"]
+STATUS_P = [0.55, 0.30, 0.10, 0.03, 0.02]
+
+WORDS = (
+    "scheduler dag task queued lost executor worker webserver operator sensor hook connection "
+    "retry backfill trigger pool slot xcom variable plugin celery kubernetes pod timeout "
+    "deadlock migration database upgrade log handler config template macro sla callback"
+).split()
+PATHOLOGIES = ["\n", "\r\n", "\t", "  ", '"quoted"', "web,ui", "'single'", '""', "a\nb"]
+
+
+def parse_rows(spec):
+    """10k / 1M / 10000000 -> int."""
+    spec = spec.strip().lower()
+    mult = {"k": 10**3, "m": 10**6}.get(spec[-1], 1)
+    return int(float(spec[:-1] if mult > 1 else spec) * mult)
+
+
+def text_pool(rng, size=4000, max_len=120_000):
+    """Pre-built texts with a heavy-tailed length distribution (sampled per row later)."""
+    lengths = np.minimum(rng.lognormal(mean=5.8, sigma=1.2, size=size).astype(int) + 2, max_len)
+    lengths[: max(1, size // 500)] = rng.integers(100_000, max_len + 1, size=max(1, size // 500))
+    vocab = np.array(WORDS + PATHOLOGIES)
+    p = np.full(len(vocab), 1.0)
+    p[len(WORDS):] = 0.15
+    p /= p.sum()
+    pool = []
+    for n in lengths:
+        words = rng.choice(vocab, size=max(1, n // 6), p=p)
+        # A bare trailing "\r" (cut "\r\n") would be written unquoted and split the record
+        pool.append(" ".join(words)[:n].rstrip("\r"))
+    return pool
+
+
+def generate(out_csv, rows, seed=7, chunk=200_000, project="SYNTH"):
+    rng = np.random.default_rng(seed)
+    pool = np.array(text_pool(rng), dtype=object)
+    out_csv = Path(out_csv)
+    out_csv.parent.mkdir(parents=True, exist_ok=True)
+    t0 = 1_400_000_000_000
+    written = 0
+    while written < rows:
+        n = min(chunk, rows - written)
+        ids = np.arange(written, written + n)
+        keys = np.char.add(f"{project}-", (ids + 1).astype(str)).astype(object)
+        dup = rng.random(n) < 0.001
+        keys[dup] = np.char.add(f"{project}-", rng.integers(1, written + n + 1, dup.sum()).astype(str))
+        created = t0 + np.sort(rng.integers(0, 10**11, n)) + written * 1000
+        summary = pool[rng.integers(0, len(pool), n)]
+        summary = np.where(rng.random(n) < 0.005, None, summary)
+        description = np.where(rng.random(n) < 0.3, None, pool[rng.integers(0, len(pool), n)])
+        df = pd.DataFrame({
+            "internal_id": 10_000_000 + ids,
+            "issue_key": keys,
+            "project": project,
+            "created_ts": created,
+            "updated_ts": created + rng.integers(0, 10**9, n),
+            "issue_type": rng.choice(ISSUE_TYPES, n, p=ISSUE_TYPE_P),
+            "status": rng.choice(STATUSES, n, p=STATUS_P),
+            "priority": rng.choice(PRIORITIES, n, p=PRIORITY_P),
+            "summary": summary,
+            "description": description,
+        }, columns=COLS)
+        df.to_csv(out_csv, index=False, header=False, mode="w" if written == 0 else "a")
+        written += n
+    return out_csv
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate a synthetic Jira export with real-export pathologies.")
+    ap.add_argument("--rows", required=True, help="Row count, e.g. 10k, 1M, 10000000")
+    ap.add_argument("--out_csv", required=True)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--project", default="SYNTH")
+    args = ap.parse_args()
+
+    out = generate(args.out_csv, parse_rows(args.rows), seed=args.seed, project=args.project)
+    print("OK")
+    print(f"Wrote: {out} ({out.stat().st_size / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-column memory of an issue table: dtype=str loading vs the compact schema (table_io.read_compact).
+
+- Pipeline tables (processed, baseline, Top-K, gated) by path; --export for the headerless raw export
+- Deep bytes per column (string payloads included), dtype of each side and the reduction factor
+- Optional JSON output (--out_json) for comparing exports or pandas versions
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from jira_export import DEFAULT_CHUNKSIZE, iter_export_chunks
+from table_io import concat_compact, iter_table_chunks, memory_report, to_compact
+
+
+def load_both(path, export, chunksize, columns=None):
+    """(dtype=str frame, compact frame) of the table at `path`."""
+    chunks = iter_export_chunks(path, chunksize) if export else iter_table_chunks(path, chunksize, columns=columns)
+    raw, compact = [], []
+    for chunk in chunks:
+        raw.append(chunk)
+        compact.append(to_compact(chunk))
+    return pd.concat(raw, ignore_index=True), concat_compact(compact)
+
+
+def compare(raw, compact):
+    before, after = memory_report(raw), memory_report(compact)
+    cols = {}
+    for col, b in before["columns"].items():
+        a = after["columns"][col]
+        cols[col] = {
+            "str_dtype": b["dtype"],
+            "str_bytes": b["bytes"],
+            "compact_dtype": a["dtype"],
+            "compact_bytes": a["bytes"],
+            "reduction": round(b["bytes"] / a["bytes"], 2) if a["bytes"] else None,
+        }
+    return {
+        "rows": len(raw),
+        "pandas": pd.__version__,
+        "columns": cols,
+        "str_total_bytes": before["total_bytes"],
+        "compact_total_bytes": after["total_bytes"],
+        "reduction": round(before["total_bytes"] / after["total_bytes"], 2) if after["total_bytes"] else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Memory per column: dtype=str vs compact typed schema.")
+    ap.add_argument("--in", dest="in_path", required=True, help="Pipeline table (.csv/.parquet/.arrow) or raw export")
+    ap.add_argument("--export", action="store_true", help="--in is the headerless raw export (01/02 --in)")
+    ap.add_argument("--columns", default=None, help="Comma-separated subset of columns (pipeline tables only)")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    ap.add_argument("--out_json", default=None)
+    args = ap.parse_args()
+
+    columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+    raw, compact = load_both(args.in_path, args.export, args.chunksize, columns)
+    report = compare(raw, compact)
+
+    print(f"{'column':<20} {'str MB':>10} {'compact MB':>11} {'x':>7}  compact dtype")
+    for col, c in report["columns"].items():
+        x = f"{c['reduction']:.1f}" if c["reduction"] else "-"
+        print(f"{col:<20} {c['str_bytes'] / 1e6:>10.1f} {c['compact_bytes'] / 1e6:>11.1f} {x:>7}  {c['compact_dtype']}")
+    print(f"{'TOTAL':<20} {report['str_total_bytes'] / 1e6:>10.1f} {report['compact_total_bytes'] / 1e6:>11.1f} "
+          f"{report['reduction'] or 0:>7.1f}")
+    if args.out_json:
+        Path(args.out_json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out_json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote: {args.out_json}")
+
+
+if __name__ == "__main__":
+    main()
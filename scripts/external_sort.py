@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Out-of-core sort for pipeline tables (streaming gate in 05).
+
+- sort_runs: sort incoming chunks in memory and spill them as run files
+  (a single run is kept in memory, so small inputs never touch disk)
+- merge_runs: k-way merge of the runs, yielding sorted blocks; each run is read
+  block_rows at a time, and more than FAN_IN runs are first merged in extra passes,
+  so memory stays about one chunk whatever the input size
+- Runs are spilled as Arrow IPC files (memory-mapped on read, column types kept as they are);
+  without pyarrow they fall back to the table_io format of `suffix`
+"""
+
+import pandas as pd
+
+from table_io import TableWriter, iter_table_chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # CSV runs
+    pa = None
+
+FAN_IN = 64
+
+
+def sort_chunk(df, by):
+    return df.sort_values(by, kind="stable").reset_index(drop=True)
+
+
+def _spill(blocks, path, suffix):
+    """Write DataFrame blocks to one run file; returns its path."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if pa is None:
+        path = path.with_suffix(suffix)
+        with TableWriter(path) as w:
+            for df in blocks:
+                w.write(df)
+        return path
+    path = path.with_suffix(".arrow")
+    writer = None
+    try:
+        for df in blocks:
+            batch = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                schema = batch.schema
+                writer = ipc.new_file(str(path), schema)
+            writer.write_table(batch.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def sort_runs(chunks, by, run_dir, suffix=".csv", run_rows=None, dtypes=None):
+    """Sorted runs of `chunks` by column `by`: file paths, or one in-memory DataFrame.
+
+    Consecutive chunks are combined into runs of up to `run_rows` rows (default: one run per chunk).
+    """
+    runs, held, pending, n = [], None, [], 0
+
+    def flush():
+        nonlocal held, pending, n
+        if held is not None:
+            runs.append(_spill([held], run_dir / f"run_{len(runs):05d}", suffix))
+        held = sort_chunk(pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True), by)
+        pending, n = [], 0
+
+    for chunk in chunks:
+        if run_rows is not None and pending and n + len(chunk) > run_rows:
+            flush()
+        pending.append(chunk)
+        n += len(chunk)
+        if run_rows is None:
+            flush()
+    if pending:
+        flush()
+    if held is None:
+        return []
+    runs.append(_spill([held], run_dir / f"run_{len(runs):05d}", suffix) if runs else held)
+
+    # Extra merge passes keep the fan-in (and so the merge buffers) bounded
+    block_rows = max(1000, len(held) // FAN_IN)
+    level = 0
+    while len(runs) > FAN_IN:
+        level += 1
+        runs = [
+            _spill(merge_runs(runs[g:g + FAN_IN], by, block_rows, dtypes),
+                   run_dir / f"pass{level}_{g // FAN_IN:05d}", suffix)
+            for g in range(0, len(runs), FAN_IN)
+        ]
+    return runs
+
+
+def _blocks(run, block_rows, dtypes):
+    if isinstance(run, pd.DataFrame):
+        for start in range(0, len(run), block_rows):
+            yield run.iloc[start:start + block_rows]
+        return
+    if run.suffix == ".arrow" and pa is not None:
+        with pa.memory_map(str(run), "r") as source:
+            table = ipc.open_file(source).read_all()
+            for start in range(0, table.num_rows, block_rows):
+                yield table.slice(start, block_rows).to_pandas()
+        return
+    for chunk in iter_table_chunks(run, block_rows):
+        if len(chunk):
+            # CSV runs come back as strings
+            yield chunk.astype(dtypes) if dtypes else chunk
+
+
+def merge_runs(runs, by, block_rows, dtypes=None):
+    """Yield the rows of sorted `runs` as blocks in `by` order (`dtypes` restores columns of CSV runs)."""
+    iters = [_blocks(r, block_rows, dtypes) for r in runs]
+    bufs = [next(it, None) for it in iters]
+    while True:
+        live = [i for i, b in enumerate(bufs) if b is not None]
+        if not live:
+            return
+        # Nothing after the smallest buffered tail can be undercut by a later read
+        bound = min(bufs[i][by].iloc[-1] for i in live)
+        parts = []
+        for i in live:
+            n = int(bufs[i][by].searchsorted(bound, side="right"))
+            parts.append(bufs[i].iloc[:n])
+            bufs[i] = bufs[i].iloc[n:] if n < len(bufs[i]) else next(iters[i], None)
+        parts = [p for p in parts if len(p)]
+        yield parts[0].reset_index(drop=True) if len(parts) == 1 else sort_chunk(pd.concat(parts, ignore_index=True), by)
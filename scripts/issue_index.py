@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+issue_key -> integer code index shared by the join stages (Paper 2).
+
+- Jira keys are PROJECT-<number>; a key is coded as (project id << 40) | number, with the project id
+  indexing a small per-table project list (unified between the two sides of a join)
+- Joins become array gathers instead of hashing strings: key numbers are dense per project, so the
+  right side is laid out in a slot table indexed by (project, number) and each left row is one lookup
+  (duplicate or very sparse keys use a sorted search instead); missing scores are lookups of -1
+- Keys are split with Arrow string kernels (a Python loop without pyarrow), so coding both sides
+  costs about as much as hashing them in DataFrame.merge
+- Codes of a table file can be cached in a directory of the caller's choosing (--key_cache; keyed
+  by path, size + mtime), so later stages reading the same file skip parsing the keys
+- Keys outside the pattern (missing, no number, leading zeros) fall back to DataFrame.merge
+"""
+
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # keys are parsed one by one instead
+    pa = None
+
+NUM_BITS = 40
+MAX_NUM = 2**NUM_BITS
+
+# Dense slot table allowed up to this many slots per joined row (plus a fixed allowance)
+DENSE_FACTOR = 8
+DENSE_MIN = 1 << 20
+
+
+class KeyCodes:
+    """Per-row (project id, number) of a key column; `valid` is False if any key is not PROJECT-<n>."""
+
+    def __init__(self, projects, proj, num, valid):
+        self.projects = list(projects)
+        self.proj = proj
+        self.num = num
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.num)
+
+    @classmethod
+    def from_keys(cls, keys):
+        keys = pd.Series(keys, copy=False)
+        n = len(keys)
+        invalid = cls([], np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64), False)
+        if n == 0:
+            return cls([], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), True)
+        if keys.isna().any():
+            return invalid
+        parsed = _split_keys_arrow(keys) if pa is not None else _split_keys(keys)
+        if parsed is None:
+            return invalid
+        proj, projects, num = parsed
+        if num.max() >= MAX_NUM:
+            return invalid
+        return cls(projects, proj, num, True)
+
+    @classmethod
+    def for_table(cls, path, keys=None, key_col="issue_key", cache_dir=None):
+        """Codes for `key_col` of the table file at `path` (`keys`: that column, if already read).
+
+        With `cache_dir` the codes are stored there and reused while the file is unchanged; nothing
+        is ever written next to the table itself.
+        """
+        path = Path(path)
+        if cache_dir is None:
+            if keys is None:
+                from table_io import read_table
+
+                keys = read_table(path, columns=[key_col])[key_col]
+            return cls.from_keys(keys)
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:12]
+        cache = cache_dir / f"{path.name}.{digest}.keyidx.npz"
+        st = path.stat()
+        stamp = np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+        if cache.exists():
+            try:
+                with np.load(cache, allow_pickle=False) as z:
+                    if str(z["key_col"]) == key_col and np.array_equal(z["stamp"], stamp):
+                        return cls(z["projects"].tolist(), z["proj"], z["num"], bool(z["valid"]))
+            except (OSError, KeyError, ValueError):
+                pass
+        if keys is None:
+            from table_io import read_table
+
+            keys = read_table(path, columns=[key_col])[key_col]
+        codes = cls.from_keys(keys)
+        tmp = cache.with_name(cache.name + ".tmp.npz")
+        try:
+            np.savez(tmp, key_col=np.array(key_col), stamp=stamp, projects=np.array(codes.projects, dtype=str),
+                     proj=codes.proj, num=codes.num, valid=np.array(codes.valid))
+            os.replace(tmp, cache)
+        except OSError:
+            pass  # unwritable cache: the index is just not persisted
+        return codes
+
+    def head(self, n):
+        return KeyCodes(self.projects, self.proj[:n], self.num[:n], self.valid)
+
+    def project_ids(self, projects):
+        """Per-row project id in another table's project list (-1 where the project is absent there)."""
+        if projects == self.projects:
+            return self.proj
+        pos = {p: i for i, p in enumerate(projects)}
+        remap = np.array([pos.get(p, -1) for p in self.projects] or [0], dtype=np.int64)
+        return remap[self.proj]
+
+    def codes(self):
+        return (self.proj << NUM_BITS) | self.num
+
+
+# PROJECT-<n> with n in canonical form: "AIRFLOW-056" must not collide with "AIRFLOW-56"
+def _split_keys_arrow(keys):
+    """(project id, sorted project list, number) per key, split in Arrow; None if a key is off-pattern."""
+    arr = pa.array(keys.astype("string[pyarrow]").array)
+    parts = pc.split_pattern(arr, "-", max_splits=1, reverse=True)
+    if not pc.all(pc.equal(pc.list_value_length(parts), 2)).as_py():
+        return None
+    prefix, digits = pc.list_element(parts, 0), pc.list_element(parts, 1)
+    n_digits = pc.utf8_length(digits)
+    ok = pc.and_(pc.greater(pc.utf8_length(prefix), 0), pc.ascii_is_decimal(digits))
+    ok = pc.and_(ok, pc.less_equal(n_digits, 12))
+    ok = pc.and_(ok, pc.or_(pc.invert(pc.starts_with(digits, "0")), pc.equal(n_digits, 1)))
+    if not pc.all(ok).as_py():
+        return None
+    uniq = pc.unique(prefix)
+    projects = pc.take(uniq, pc.sort_indices(uniq))
+    proj = pc.index_in(prefix, value_set=projects).to_numpy().astype(np.int64)
+    return proj, projects.to_pylist(), pc.cast(digits, pa.int64()).to_numpy()
+
+
+def _split_keys(keys):
+    """Same as _split_keys_arrow, one key at a time (without pyarrow)."""
+    parts = [str(k).rpartition("-") for k in keys.to_numpy(dtype=object)]
+    if not all(p and d.isascii() and d.isdigit() and len(d) <= 12 and (d[0] != "0" or d == "0")
+               for p, _, d in parts):
+        return None
+    num = np.fromiter((int(d) for _, _, d in parts), dtype=np.int64, count=len(parts))
+    proj, projects = pd.factorize(np.array([p for p, _, _ in parts], dtype=object), sort=True)
+    return proj.astype(np.int64), [str(p) for p in projects], num
+
+
+def _dense_lookup(left, right):
+    """Right row per left row (-1 if none) through a per-project slot table indexed by key number.
+
+    Jira numbers are dense per project, so the table is about as long as the largest key number.
+    Returns None when keys are too sparse for that or the right side has duplicate keys.
+    """
+    rproj = right.project_ids(left.projects)
+    known = rproj >= 0
+    max_num = np.full(len(left.projects), -1, dtype=np.int64)
+    np.maximum.at(max_num, rproj[known], right.num[known])
+    base = np.concatenate([[0], np.cumsum(max_num + 1)])
+    if base[-1] > DENSE_FACTOR * (len(left) + len(right)) + DENSE_MIN:
+        return None
+    rows = np.flatnonzero(known)
+    slot_r = base[rproj[rows]] + right.num[rows]
+    table = np.full(base[-1], -1, dtype=np.int64)
+    table[slot_r] = rows
+    if not np.array_equal(table[slot_r], rows):
+        return None  # duplicate keys on the right: several matches per left row
+    ok = left.num <= max_num[left.proj]
+    if not len(table):
+        return np.full(len(left), -1, dtype=np.int64)  # no project in common
+    return np.where(ok, table[np.where(ok, base[left.proj] + left.num, 0)], -1)
+
+
+def join_positions(left, right, how="left"):
+    """Row pairs of a left/inner join on the coded keys, in DataFrame.merge order.
+
+    Returns (left_rows, right_rows); right_rows is -1 where a left row has no match (how="left").
+    Returns None for an inner join with duplicate right keys (merge orders those matches its own way).
+    """
+    right_rows = _dense_lookup(left, right) if len(left) and len(right) else None
+    if right_rows is not None:
+        left_rows = np.arange(len(left))
+        if how == "inner":
+            hit = right_rows >= 0
+            return left_rows[hit], right_rows[hit]
+        return left_rows, right_rows
+    if how == "inner":
+        return None
+
+    # General case (duplicate or sparse keys): sorted codes + searchsorted
+    lcodes = left.codes()
+    rproj = right.project_ids(left.projects)
+    rcodes = np.where(rproj >= 0, (rproj << NUM_BITS) | right.num, -1)
+    order = np.argsort(rcodes, kind="stable")
+    rsorted = rcodes[order]
+    lo = np.searchsorted(rsorted, lcodes, side="left")
+    cnt = np.searchsorted(rsorted, lcodes, side="right") - lo
+    reps = np.maximum(cnt, 1) if how == "left" else cnt
+    left_rows = np.repeat(np.arange(len(lcodes)), reps)
+    # Offset of each output row inside its left row's group of matches
+    starts = np.cumsum(reps) - reps
+    within = np.arange(len(left_rows)) - np.repeat(starts, reps)
+    matched = cnt[left_rows] > 0
+    right_rows = np.full(len(left_rows), -1, dtype=np.int64)
+    right_rows[matched] = order[lo[left_rows[matched]] + within[matched]]
+    return left_rows, right_rows
+
+
+def take_with_missing(values, rows):
+    """values[rows] with missing values where rows == -1 (same upcasting as a left merge)."""
+    return pd.api.extensions.take(values, rows, allow_fill=True)
+
+
+def merge_on_key(left, right, on="issue_key", how="left", validate=None, left_codes=None, right_codes=None):
+    """left.merge(right, on=on, how=how) through the integer key index (falls back to merge)."""
+    if how not in ("left", "inner"):
+        raise ValueError(f"merge_on_key supports how='left'/'inner', got {how!r}")
+    left_codes = left_codes if left_codes is not None else KeyCodes.from_keys(left[on])
+    right_codes = right_codes if right_codes is not None else KeyCodes.from_keys(right[on])
+    overlap = (set(left.columns) & set(right.columns)) - {on}
+    if overlap or not (left_codes.valid and right_codes.valid):
+        return left.merge(right, on=on, how=how, validate=validate)
+
+    if validate == "one_to_one":
+        if len(np.unique(left_codes.codes())) != len(left_codes):
+            raise pd.errors.MergeError("Merge keys are not unique in left dataset; not a one-to-one merge")
+        if len(np.unique(right_codes.codes())) != len(right_codes):
+            raise pd.errors.MergeError("Merge keys are not unique in right dataset; not a one-to-one merge")
+    elif validate is not None:
+        return left.merge(right, on=on, how=how, validate=validate)
+
+    pairs = join_positions(left_codes, right_codes, how)
+    if pairs is None:
+        return left.merge(right, on=on, how=how, validate=validate)
+    left_rows, right_rows = pairs
+    if how == "left" and len(left_rows) == len(left):
+        out = left.reset_index(drop=True)  # no left row matched twice: rows stay in place
+    else:
+        out = left.iloc[left_rows].reset_index(drop=True)
+    cols = {c: take_with_missing(right[c].array, right_rows) for c in right.columns if c != on}
+    return pd.concat([out, pd.DataFrame(cols, index=out.index)], axis=1) if cols else out
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Shared streaming ingestion for the raw Jira export (Paper 2).
+
+- Reads the headerless export in bounded-size chunks (multi-line quoted fields are handled by the parser)
+- Accumulates the 01 schema report counters incrementally, one chunk at a time; reports of export
+  partitions merge (issue_key distinct counts via key_sketch)
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from key_sketch import DEFAULT_P, HyperLogLog, KeyHashSet, hash_keys
+from table_io import iter_table_chunks, table_format
+
+
+COLS = [
+    "internal_id",
+    "issue_key",
+    "project",
+    "created_ts",
+    "updated_ts",
+    "issue_type",
+    "status",
+    "priority",
+    "summary",
+    "description",
+]
+
+DEFAULT_CHUNKSIZE = 100_000
+
+COUNT_FIELDS = ["issue_type", "priority", "status", "project"]
+DISTINCT_MODES = ("exact", "hll")
+
+
+def iter_export_chunks(in_csv, chunksize=DEFAULT_CHUNKSIZE, engine="c"):
+    """Yield the raw export as DataFrames of at most `chunksize` rows.
+
+    The C engine parses quoted fields with embedded newlines/quotes correctly and is much faster;
+    engine="python" is kept as a fallback for exports the C parser rejects.
+    A .parquet/.arrow path (written by 01 --out_table) is streamed without re-parsing CSV.
+    """
+    if table_format(in_csv) != "csv":
+        yield from iter_table_chunks(in_csv, chunksize, columns=COLS)
+        return
+    reader = pd.read_csv(
+        in_csv,
+        names=COLS,
+        header=None,
+        dtype=str,
+        engine=engine,
+        chunksize=chunksize,
+    )
+    with reader:
+        yield from reader
+
+
+class SchemaReport:
+    """Incremental version of the 01 schema report (same keys, same ordering of counts).
+
+    All counters are filled in one pass per chunk and merge() across export partitions.
+    issue_key distinct/duplicate counts come from a KeyHashSet (exact, the default) or, with
+    distinct="hll", from a HyperLogLog estimate only (fixed memory; the report says it is estimated).
+    """
+
+    def __init__(self, distinct="exact", p=DEFAULT_P):
+        if distinct not in DISTINCT_MODES:
+            raise ValueError(f"distinct must be one of {DISTINCT_MODES}, got {distinct!r}")
+        self.distinct = distinct
+        self.rows = 0
+        self.missing = Counter({c: 0 for c in COLS})
+        self.issue_type = Counter()
+        self.priority = Counter()
+        self.status = Counter()
+        self.project = Counter()
+        self.key_hashes = KeyHashSet() if distinct == "exact" else None
+        self.key_hll = HyperLogLog(p)
+
+    def update(self, df):
+        self.rows += len(df)
+        self.missing.update(df.isna().sum().to_dict())
+        for field in COUNT_FIELDS:
+            # sort=False keeps first-seen order so ties rank like a whole-frame value_counts()
+            getattr(self, field).update(df[field].value_counts(sort=False).to_dict())
+        hashes = hash_keys(df["issue_key"])
+        if self.key_hashes is not None:
+            self.key_hashes.update(hashes)
+        self.key_hll.update(hashes)
+        return self
+
+    def merge(self, other):
+        """Fold the report of a later partition into this one (merge in export order to keep tie order)."""
+        if other.distinct != self.distinct:
+            raise ValueError(f"Cannot merge distinct={self.distinct!r} and distinct={other.distinct!r} reports")
+        self.rows += other.rows
+        self.missing.update(other.missing)
+        for field in COUNT_FIELDS:
+            getattr(self, field).update(getattr(other, field))
+        if self.key_hashes is not None:
+            self.key_hashes.merge(other.key_hashes)
+        self.key_hll.merge(other.key_hll)
+        return self
+
+    def unique_keys(self):
+        """(distinct issue keys, estimated?)."""
+        if self.key_hashes is not None:
+            return len(self.key_hashes), False
+        # An estimate can overshoot; there are never more distinct keys than non-missing ones
+        return min(round(self.key_hll.estimate()), self.rows - self.missing["issue_key"]), True
+
+    def to_dict(self):
+        unique_keys, estimated = self.unique_keys()
+        report = {
+            "rows": int(self.rows),
+            "columns": list(COLS),
+            "missing_per_column": {c: int(self.missing[c]) for c in COLS},
+            "issue_type_counts_top10": _counts(self.issue_type, 10),
+            "priority_counts": _counts(self.priority),
+            "status_counts_top10": _counts(self.status, 10),
+            "project_counts": _counts(self.project),
+            "unique_issue_keys": int(unique_keys),
+            "duplicate_issue_keys": int(self.rows - unique_keys),
+        }
+        if estimated:
+            report["unique_issue_keys_estimated"] = True
+            report["unique_issue_keys_std_error"] = round(self.key_hll.standard_error(), 4)
+        return report
+
+    def save(self, path):
+        """Store the counters (.npz) so partition reports can be merged later (load + merge)."""
+        arrays = {
+            "meta": np.array([self.rows, int(self.key_hashes is not None)], dtype=np.int64),
+            "missing": np.array([self.missing[c] for c in COLS], dtype=np.int64),
+            **self.key_hll.to_arrays("key_hll"),
+        }
+        for field in COUNT_FIELDS:
+            counter = getattr(self, field)
+            arrays[f"{field}_values"] = np.array(list(counter), dtype=str)
+            arrays[f"{field}_counts"] = np.array(list(counter.values()), dtype=np.int64)
+        if self.key_hashes is not None:
+            arrays.update(self.key_hashes.to_arrays("key"))
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            rows, exact = (int(x) for x in z["meta"])
+            hll = HyperLogLog.from_arrays(z, "key_hll")
+            report = cls("exact" if exact else "hll", hll.p)
+            report.rows = rows
+            report.missing = Counter(dict(zip(COLS, z["missing"].tolist())))
+            report.key_hll = hll
+            for field in COUNT_FIELDS:
+                setattr(report, field, Counter(dict(zip(z[f"{field}_values"].tolist(), z[f"{field}_counts"].tolist()))))
+            if exact:
+                report.key_hashes = KeyHashSet.from_arrays(z, "key")
+        return report
+
+
+def _counts(counter, n=None):
+    return {k: int(v) for k, v in counter.most_common(n)}
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Import the numbered stage scripts (01_..., 02_...) as modules.
+
+Stage file names start with digits, so they cannot be imported with a plain `import`;
+this loads them by file name so drivers can reuse stage logic without a subprocess.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPTS = Path(__file__).resolve().parent
+
+_loaded = {}
+
+
+def load_stage(name):
+    """Module for scripts/<name>.py, e.g. load_stage("03_priority_only_baseline")."""
+    if name not in _loaded:
+        path = SCRIPTS / f"{name}.py"
+        spec = importlib.util.spec_from_file_location(f"stage_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        if str(SCRIPTS) not in sys.path:
+            sys.path.insert(0, str(SCRIPTS))
+        spec.loader.exec_module(module)
+        _loaded[name] = module
+    return _loaded[name]
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Mergeable streaming quantile sketch for the LOCKED_GATE_V2 thresholds (KLL-style).
+
+- Values are kept exactly up to `exact_limit`; quantiles are then identical to
+  Series.quantile (linear interpolation), so small score scopes reproduce the paper numbers
+- Past that, values are compacted KLL-style: levels of weight 2^h, each level's capacity
+  shrinking by 2/3 per step below the top; a full level is sorted and every other item
+  (random offset) is promoted. Size is O(k log(n/k)) whatever n is
+- Sketches of score partitions (parallel/per-project scoring runs) merge into the sketch of the
+  union; rank_error() reports the normalized rank error bound (0 while exact)
+- Score sketches are stored next to a scores file as <scores>.qsketch.npz (keyed by size + mtime)
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 200
+EXACT_LIMIT = 100_000
+SCORE_COLS = ["C", "S", "V"]
+
+_C = 2.0 / 3.0
+_MIN_WIDTH = 8
+
+
+class QuantileSketch:
+    def __init__(self, k=DEFAULT_K, exact_limit=EXACT_LIMIT, seed=0):
+        self.k = int(k)
+        self.exact_limit = int(exact_limit)
+        self.n = 0
+        self.compacted = False
+        self.levels = [np.empty(0, dtype=np.float64)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def is_exact(self):
+        return not self.compacted
+
+    def _capacity(self, h):
+        depth = len(self.levels) - 1 - h
+        return max(_MIN_WIDTH, int(np.ceil(self.k * _C**depth)))
+
+    def update(self, values):
+        """Add values (NaN is skipped, like Series.quantile)."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        v = v[~np.isnan(v)]
+        if len(v):
+            self.n += len(v)
+            self.levels[0] = np.concatenate([self.levels[0], v])
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold `other` (a sketch of another partition) into this one."""
+        if other.k != self.k:
+            raise ValueError(f"Cannot merge sketches with k={self.k} and k={other.k}")
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.compacted = self.compacted or other.compacted
+        self._compress()
+        return self
+
+    def _compress(self):
+        if not self.compacted and self.n <= self.exact_limit:
+            return
+        self.compacted = True
+        # Repeat until every level fits: a new top level shrinks the capacity of those below it
+        full = True
+        while full:
+            full = False
+            for h in range(len(self.levels)):
+                items = self.levels[h]
+                if len(items) <= self._capacity(h):
+                    continue
+                full = True
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                items = np.sort(items)
+                # An odd item out stays at this level; the rest halves into the next one
+                keep, items = (items[:1], items[1:]) if len(items) % 2 else (items[:0], items)
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[self._rng.integers(2)::2]])
+
+    def quantile(self, q):
+        """Value at quantile q (float or list); exact (linear interpolation) while is_exact."""
+        if self.n == 0:
+            return np.nan if np.isscalar(q) else [np.nan] * len(q)
+        if self.is_exact:
+            out = np.quantile(self.levels[0], q)
+            return float(out) if np.isscalar(q) else [float(x) for x in out]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2**h, dtype=np.int64) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        items, cum = items[order], np.cumsum(weights[order])
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        idx = np.minimum(np.searchsorted(cum, qs * cum[-1], side="left"), len(items) - 1)
+        out = [float(x) for x in items[idx]]
+        return out[0] if np.isscalar(q) else out
+
+    def rank_error(self):
+        """Normalized rank error bound of quantile() (99% confidence; DataSketches fit for KLL)."""
+        return 0.0 if self.is_exact else float(2.296 / self.k**0.9723)
+
+    def to_arrays(self, prefix):
+        return {
+            f"{prefix}_items": np.concatenate(self.levels),
+            f"{prefix}_sizes": np.array([len(lv) for lv in self.levels], dtype=np.int64),
+            f"{prefix}_meta": np.array([self.k, self.exact_limit, self.n, int(self.compacted)], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, z, prefix, seed=0):
+        k, exact_limit, n, compacted = (int(x) for x in z[f"{prefix}_meta"])
+        sk = cls(k, exact_limit, seed)
+        sk.n, sk.compacted = n, bool(compacted)
+        bounds = np.cumsum(z[f"{prefix}_sizes"])[:-1]
+        sk.levels = [lv.astype(np.float64) for lv in np.split(z[f"{prefix}_items"], bounds)]
+        return sk
+
+
+def sketch_path(scores_path):
+    path = Path(scores_path)
+    return path.with_name(path.name + ".qsketch.npz")
+
+
+def _stamp(path):
+    st = Path(path).stat()
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def save_sketches(scores_path, sketches):
+    """Store per-column sketches next to the scores file they summarize."""
+    arrays = {"columns": np.array(list(sketches), dtype=str), "stamp": _stamp(scores_path)}
+    for col, sk in sketches.items():
+        arrays.update(sk.to_arrays(col))
+    out = sketch_path(scores_path)
+    with open(out, "wb") as f:
+        np.savez(f, **arrays)
+    return out
+
+
+def load_sketches(path, scores_path=None):
+    """Sketches from a .qsketch.npz; None if missing, unreadable or older than `scores_path`."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            if scores_path is not None and not np.array_equal(z["stamp"], _stamp(scores_path)):
+                return None
+            return {str(c): QuantileSketch.from_arrays(z, str(c)) for c in z["columns"]}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def merge_sketches(parts):
+    """Merge a list of {column: sketch} dicts (e.g. one per scoring partition)."""
+    merged = {}
+    for part in parts:
+        for col, sk in part.items():
+            if col in merged:
+                merged[col].merge(sk)
+            else:
+                merged[col] = sk
+    return merged
+
+
+def build_sketches(chunks, columns=SCORE_COLS, k=DEFAULT_K):
+    sketches = {c: QuantileSketch(k) for c in columns}
+    for chunk in chunks:
+        for c in columns:
+            sketches[c].update(pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype="float64", na_value=np.nan))
+    return sketches
+
+
+def score_sketches(scores_path, chunksize, columns=SCORE_COLS):
+    """Sketches of a scores file: the stored sidecar if it is current, else one streaming pass (then stored)."""
+    sketches = load_sketches(sketch_path(scores_path), scores_path)
+    if sketches is not None and all(c in sketches for c in columns):
+        return sketches
+    from table_io import iter_table_chunks
+
+    sketches = build_sketches(iter_table_chunks(scores_path, chunksize, columns=list(columns)), columns)
+    try:
+        save_sketches(scores_path, sketches)
+    except OSError:
+        pass  # read-only location: the sketch is just not persisted
+    return sketches
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Vectorized PRISM readiness gate (shared by the gate scripts).
+
+- LOCKED_GATE_V1: numeric thresholds (C_min, S_min, V_max)
+- LOCKED_GATE_V2: quantile thresholds (S_min_quantile, V_max_quantile) computed from scores scope
+  (exactly, or from mergeable quantile sketches: quantile_sketch.py)
+
+Rules are evaluated as boolean masks over whole columns. Deferral reasons are kept as a
+compact uint8 bitmask per row and decoded to reason lists only when output needs them.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+# Bit order == order in which reasons are listed for a row
+REASONS = ["missing_scores", "low_C", "low_S", "high_V", "low_S_q", "high_V_q"]
+BIT = {r: np.uint8(1 << i) for i, r in enumerate(REASONS)}
+
+RULES = ("LOCKED_GATE_V1", "LOCKED_GATE_V2")
+
+
+def parse_ks(spec):
+    """Comma-separated K values; an entry "start:stop:step" expands to a range (stop inclusive)."""
+    ks = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            start, stop, step = (int(x) for x in part.split(":"))
+            ks.extend(range(start, stop + 1, step))
+        else:
+            ks.append(int(part))
+    return ks
+
+
+def load_gate_cfg(path):
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def gate_thresholds(cfg, scores, sketches=None):
+    """Resolve the thresholds a config needs (V2 quantiles are taken over the full `scores` scope).
+
+    With `sketches` ({column: QuantileSketch} of the scope) V2 quantiles come from the sketches
+    instead, and the thresholds also carry the sketch's normalized rank error.
+    """
+    rule = cfg.get("rule", "LOCKED_GATE_V1")
+    if rule == "LOCKED_GATE_V1":
+        return {
+            "C_min": float(cfg.get("C_min", 0.0)),
+            "S_min": float(cfg.get("S_min", 0.0)),
+            "V_max": float(cfg.get("V_max", 1.0)),
+        }
+    if rule == "LOCKED_GATE_V2" and sketches is not None:
+        return {
+            "S_q": sketches["S"].quantile(float(cfg["S_min_quantile"])),
+            "V_q": sketches["V"].quantile(float(cfg["V_max_quantile"])),
+            "quantile_mode": "sketch",
+            "rank_error": max(sketches["S"].rank_error(), sketches["V"].rank_error()),
+        }
+    if rule == "LOCKED_GATE_V2":
+        # Declared, not optimized
+        return {
+            "S_q": float(scores["S"].quantile(float(cfg["S_min_quantile"]))),
+            "V_q": float(scores["V"].quantile(float(cfg["V_max_quantile"]))),
+        }
+    raise ValueError(f"Unknown gate rule: {rule}")
+
+
+def _col(df, name):
+    return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def gate_mask(df, cfg, thresholds):
+    """uint8 reason bitmask per row of `df` (columns C, S, V); 0 means ready."""
+    rule = cfg.get("rule", "LOCKED_GATE_V1")
+    C = _col(df, "C")
+    S = _col(df, "S")
+    V = _col(df, "V")
+
+    mask = np.zeros(len(df), dtype=np.uint8)
+    if rule == "LOCKED_GATE_V1":
+        mask |= np.where(C < thresholds["C_min"], BIT["low_C"], 0).astype(np.uint8)
+        mask |= np.where(S < thresholds["S_min"], BIT["low_S"], 0).astype(np.uint8)
+        mask |= np.where(V > thresholds["V_max"], BIT["high_V"], 0).astype(np.uint8)
+    elif rule == "LOCKED_GATE_V2":
+        # Minimal admissibility: defer bottom-decile specificity and top-decile volatility
+        mask |= np.where(S < thresholds["S_q"], BIT["low_S_q"], 0).astype(np.uint8)
+        mask |= np.where(V > thresholds["V_q"], BIT["high_V_q"], 0).astype(np.uint8)
+    else:
+        raise ValueError(f"Unknown gate rule: {rule}")
+
+    # Missing scores short-circuit every other reason
+    missing = np.isnan(C) | np.isnan(S) | np.isnan(V)
+    mask[missing] = BIT["missing_scores"]
+    return mask
+
+
+def decode_reasons(mask):
+    """Reason lists per row, in REASONS order."""
+    return [[r for r in REASONS if m & BIT[r]] for m in np.asarray(mask).tolist()]
+
+
+def reason_counts(mask):
+    """Deferred reason counts, ordered like value_counts() over the flattened per-row reason lists."""
+    mask = np.asarray(mask)
+    found = []
+    for bit_pos, r in enumerate(REASONS):
+        hits = np.flatnonzero(mask & BIT[r])
+        if len(hits):
+            # Ties in count keep first-appearance order: first row, then position within the row
+            found.append((-len(hits), int(hits[0]), bit_pos, r))
+    return {r: -neg for neg, _, _, r in sorted(found)}
+
+
+class PrefixCounts:
+    """Ready/deferred/reason counts for every prefix mask[:n], from one cumulative pass over the mask."""
+
+    def __init__(self, mask):
+        mask = np.asarray(mask, dtype=np.uint8)
+        self.n = len(mask)
+        self.ready_cum = np.concatenate([[0], np.cumsum(mask == 0)])
+        self.reason_cum = {}
+        self.first_hit = {}
+        for r in REASONS:
+            hit = (mask & BIT[r]) != 0
+            self.reason_cum[r] = np.concatenate([[0], np.cumsum(hit)])
+            idx = np.flatnonzero(hit)
+            self.first_hit[r] = int(idx[0]) if len(idx) else self.n
+
+    def ready(self, n):
+        return int(self.ready_cum[n])
+
+    def deferred(self, n):
+        return int(n - self.ready_cum[n])
+
+    def reason_counts(self, n):
+        """Same result (and ordering) as reason_counts(mask[:n])."""
+        found = []
+        for bit_pos, r in enumerate(REASONS):
+            count = int(self.reason_cum[r][n])
+            if count:
+                found.append((-count, self.first_hit[r], bit_pos, r))
+        return {r: -neg for neg, _, _, r in sorted(found)}
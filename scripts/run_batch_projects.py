@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Multi-project batch run of the Paper 2 pipeline (01 → 07 per Jira project).
+
+- Streams one or more exports once and partitions rows by `project` into per-project exports
+  (same headerless format, so every stage runs unchanged)
+- Runs each project's 01 → 07 chain in a process pool, one stage at a time per worker; with
+  --stage_mem_mb every stage process (and each scorer 06 starts) runs under that address-space
+  limit (RLIMIT_AS), so a stage that outgrows it fails and only its project is marked failed
+- A project whose chain raises anything (failed stage, I/O error, bad report) is recorded as
+  failed; the other projects still run
+- Merges per-project reports into batch_report.json: the per-project 01 counters merge into one
+  portfolio schema report, and with LOCKED_GATE_V2 the per-project score sketches (written by 06)
+  are merged into portfolio-wide thresholds
+"""
+
+import argparse
+import json
+import re
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from jira_export import DEFAULT_CHUNKSIZE, SchemaReport, iter_export_chunks
+from pipeline_stages import SCRIPTS
+from quantile_sketch import merge_sketches, score_sketches
+from readiness_gate import gate_thresholds, load_gate_cfg
+
+
+def project_slug(project):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(project)) or "_unknown"
+
+
+def partition_exports(in_csvs, out_dir, chunksize, engine):
+    """Append every row to <out_dir>/<project>/export.csv; returns {slug: rows}.
+
+    Raises ValueError when two different projects map to the same directory name.
+    """
+    rows = {}
+    source = {}  # slug -> project it was made from
+    for in_csv in in_csvs:
+        for chunk in iter_export_chunks(in_csv, chunksize=chunksize, engine=engine):
+            projects = chunk["project"].fillna("_unknown")
+            for project, part in chunk.groupby(projects, sort=False):
+                slug = project_slug(project)
+                if source.setdefault(slug, project) != project:
+                    raise ValueError(f"Projects {source[slug]!r} and {project!r} both map to the directory "
+                                     f"{slug!r}; their rows would be merged into one export")
+                pdir = out_dir / slug
+                pdir.mkdir(parents=True, exist_ok=True)
+                part.to_csv(pdir / "export.csv", index=False, header=False, mode="a" if slug in rows else "w")
+                rows[slug] = rows.get(slug, 0) + len(part)
+    return rows
+
+
+def limit_memory(mb):
+    """preexec_fn capping the child's address space (inherited by the processes it starts)."""
+    def apply():
+        limit = mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    return apply
+
+
+def run_stage(cmd, log_file, mem_mb=0):
+    log_file.write("RUN: " + " ".join(cmd) + "\n")
+    log_file.flush()
+    subprocess.check_call(cmd, stdout=log_file, stderr=subprocess.STDOUT,
+                          preexec_fn=limit_memory(mem_mb) if mem_mb else None)
+
+
+def run_project(slug, pdir, opts):
+    """Full 01 → 07 chain for one project partition (runs inside a pool worker)."""
+    t0 = time.perf_counter()
+    py = sys.executable
+    export = pdir / "export.csv"
+    logs = pdir / "logs"
+    logs.mkdir(parents=True, exist_ok=True)
+    processed = pdir / "processed.csv"
+    baseline = pdir / "priority_only_baseline.csv"
+    scores = pdir / "prism_scores.csv"
+    mem = opts["stage_mem_mb"]
+
+    with open(logs / "run.log", "w", encoding="utf-8") as log:
+        run_stage([py, str(SCRIPTS / "01_load_and_parse.py"), "--in", str(export), "--out_dir", str(logs),
+                   "--sketch_out", str(logs / "01_schema_sketch.npz")], log, mem)
+        run_stage([py, str(SCRIPTS / "02_text_construction.py"), "--in", str(export), "--out_csv", str(processed),
+                   "--out_report", str(logs / "02_text_report.json"), "--min_len", str(opts["min_len"])], log, mem)
+        run_stage([py, str(SCRIPTS / "03_priority_only_baseline.py"), "--in_csv", str(processed),
+                   "--out_csv", str(baseline), "--out_report", str(logs / "03_priority_only_report.json")], log, mem)
+
+        n = json.loads((logs / "03_priority_only_report.json").read_text(encoding="utf-8"))["rows"]
+        if n == 0:
+            return {"project": slug, "status": "empty", "seconds": round(time.perf_counter() - t0, 3)}
+        # Small projects: keep the Ks that fit, else a single K = all rows
+        ks = [k for k in opts["ks"] if k <= n] or [n]
+        ks_arg = ",".join(str(k) for k in ks)
+        topk_dir = pdir / "topk"
+        run_stage([py, str(SCRIPTS / "04_freeze_topk_sets.py"), "--in_csv", str(baseline),
+                   "--out_dir", str(topk_dir), "--ks", ks_arg], log, mem)
+
+        if opts["scores_csv"]:
+            scores = Path(opts["scores_csv"])
+        elif not opts["skip_scoring"]:
+            prism_in = pdir / f"{slug.lower()}_for_prism_top{max(ks)}.csv"
+            run_stage([py, str(SCRIPTS / "06a_prepare_airflow_for_prism.py"),
+                       "--in_csv", str(topk_dir / f"baseline_topk_{max(ks)}.csv"), "--out_csv", str(prism_in),
+                       "--system", slug.lower()], log, mem)
+            run_stage([py, str(SCRIPTS / "06_run_prism_scoring_airflow.py"), "--input", str(prism_in),
+                       "--outdir", str(pdir / "prism_scores_tmp"), "--final_out", str(scores),
+                       "--workers", str(opts["scorer_workers"])], log, mem)
+        else:
+            scores.write_text("issue_key,C,S,V\n", encoding="utf-8")
+
+        run_stage([py, str(SCRIPTS / "07_apply_readiness_gate.py"), "--baseline_csv", str(baseline),
+                   "--scores_csv", str(scores), "--out_dir", str(pdir / "gated"), "--ks", ks_arg,
+                   "--gate_cfg", str(opts["gate_cfg"])], log, mem)
+
+    return {"project": slug, "status": "ok", "ks": ks, "seconds": round(time.perf_counter() - t0, 3)}
+
+
+def load_json(path):
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+
+def merge_reports(out_dir, results):
+    """Per-project reports side by side, plus portfolio totals.
+
+    totals["schema"] is the 01 report of all projects together, merged from the per-project
+    counters (issue keys repeated across projects count as duplicates there, unlike the sum).
+    """
+    projects = {}
+    schema_all = None
+    totals = {"projects": 0, "rows": 0, "rows_after_min_len": 0, "duplicate_issue_keys": 0,
+              "missing_per_column": {}, "priority_counts": {}}
+    for res in sorted(results, key=lambda r: r["project"]):
+        pdir = out_dir / res["project"]
+        schema = load_json(pdir / "logs" / "01_schema_report.json")
+        text = load_json(pdir / "logs" / "02_text_report.json")
+        gate = load_json(pdir / "gated" / "gate_report_all.json")
+        projects[res["project"]] = {"run": res, "schema": schema, "text": text, "gate": gate}
+        sketch = pdir / "logs" / "01_schema_sketch.npz"
+        if sketch.exists():
+            part = SchemaReport.load(sketch)
+            schema_all = part if schema_all is None else schema_all.merge(part)
+
+        totals["projects"] += 1
+        if schema:
+            totals["rows"] += schema["rows"]
+            totals["duplicate_issue_keys"] += schema["duplicate_issue_keys"]
+            for key in ("missing_per_column", "priority_counts"):
+                for k, v in schema[key].items():
+                    totals[key][k] = totals[key].get(k, 0) + v
+        if text:
+            totals["rows_after_min_len"] += text["rows_after"]
+    totals["priority_counts"] = dict(sorted(totals["priority_counts"].items(), key=lambda kv: -kv[1]))
+    if schema_all is not None:
+        totals["schema"] = schema_all.to_dict()
+    return {"totals": totals, "projects": projects}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run 01 → 07 per Jira project across many exports, in parallel.")
+    ap.add_argument("--in", dest="in_csvs", nargs="+", required=True, help="One or more raw Jira exports")
+    ap.add_argument("--out_dir", required=True, help="Per-project outputs go to <out_dir>/<project>/")
+    ap.add_argument("--gate_cfg", required=True)
+    ap.add_argument("--ks", default="50,100,250,500")
+    ap.add_argument("--min_len", type=int, default=30)
+    ap.add_argument("--workers", type=int, default=4, help="Projects processed concurrently")
+    ap.add_argument("--scorer_workers", type=int, default=1, help="06 --workers inside each project")
+    ap.add_argument("--scores_csv", default=None, help="Existing issue_key,C,S,V scores covering all projects")
+    ap.add_argument("--skip_scoring", action="store_true", help="Gate without PRISM scores (all missing_scores)")
+    ap.add_argument("--stage_mem_mb", type=int, default=0,
+                    help="Address-space (virtual memory, above peak RSS) limit in MB of every stage process; "
+                         "0 = unlimited")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    ap.add_argument("--engine", default="c", choices=["c", "python"])
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # 1) Partition by project (one streaming pass over all exports)
+    partitions = partition_exports(args.in_csvs, out_dir, args.chunksize, args.engine)
+    print(f"OK partitioned {sum(partitions.values())} rows into {len(partitions)} projects")
+
+    # 2) One 01 → 07 chain per project, in parallel
+    opts = {
+        "ks": [int(x) for x in args.ks.split(",") if x.strip()],
+        "min_len": args.min_len,
+        "gate_cfg": str(Path(args.gate_cfg).resolve()),
+        "scores_csv": str(Path(args.scores_csv).resolve()) if args.scores_csv else None,
+        "skip_scoring": args.skip_scoring,
+        "scorer_workers": args.scorer_workers,
+        "stage_mem_mb": args.stage_mem_mb,
+    }
+    results = []
+    failed = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {pool.submit(run_project, slug, out_dir / slug, opts): slug for slug in partitions}
+        for fut in as_completed(futures):
+            slug = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                # Any failure (stage exit code, I/O, a broken worker) is this project's alone
+                res = {"project": slug, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+                failed.append(slug)
+            results.append(res)
+            print(f"{res['status'].upper()} {slug} (see {out_dir / slug / 'logs' / 'run.log'})")
+
+    # 3) Merge per-project reports
+    report = merge_reports(out_dir, results)
+    cfg = load_gate_cfg(args.gate_cfg)
+    if cfg.get("rule") == "LOCKED_GATE_V2" and not (args.scores_csv or args.skip_scoring):
+        parts = [score_sketches(out_dir / r["project"] / "prism_scores.csv", args.chunksize)
+                 for r in results if r["status"] == "ok"]
+        if parts:
+            report["totals"]["portfolio_thresholds"] = gate_thresholds(cfg, None, merge_sketches(parts))
+    report["totals"]["seconds"] = round(time.perf_counter() - t0, 3)
+    (out_dir / "batch_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print("OK wrote:", out_dir / "batch_report.json")
+    if failed:
+        raise SystemExit(f"Failed projects: {sorted(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Incremental pipeline run driven by updated_ts (Paper 2).
+
+- Keeps a manifest (issue_key, updated_ts) of the last processed export in --state_dir
+- On a new export, only new/changed issues go through text construction (02) and PRISM scoring (06)
+- The processed table, the priority-only baseline and the scores are patched, not rebuilt:
+  unchanged rows keep their relative order and new rows are inserted at their sorted position
+- Gating (07) is re-run on the patched baseline; it only touches the max-K prefix
+- With no manifest yet, every issue counts as new (equivalent to a full run)
+- A repeated issue_key is diffed on all its updated_ts values; all its rows are reprocessed together
+- State tables are committed only after 07 succeeds, so a failed run can simply be re-run
+
+NOTE: PRISM scorers see only the delta rows. If a scorer normalizes across the whole input,
+use --full_rescore to score the entire Top-K scope instead.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from jira_export import DEFAULT_CHUNKSIZE, iter_export_chunks
+from pipeline_stages import SCRIPTS, load_stage
+from table_io import read_table, write_table
+
+
+SORT_BY = ["priority_ordinal", "created_ts_num", "issue_key"]
+SIG_SEP = "\x1f"  # joins the updated_ts values of a repeated key (never part of a timestamp)
+
+
+class _SortKeyView:
+    """Read-only sequence of (priority_ordinal, created_ts, issue_key) tuples, so bisect works without copies."""
+
+    def __init__(self, df):
+        self.ordinal = df["priority_ordinal"].to_numpy()
+        self.ts = df["created_ts_num"].to_numpy()
+        self.key = df["issue_key"].to_numpy()
+
+    def __len__(self):
+        return len(self.key)
+
+    def __getitem__(self, i):
+        return (self.ordinal[i], self.ts[i], self.key[i])
+
+
+def _ts_text(values):
+    """updated_ts as text, "" when missing (same text for CSV and parquet/arrow manifests)."""
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        # Columnar state stores whole-number Int64; pandas reads it back as float64 when it has nulls
+        values = values.astype("Int64")
+    return values.astype(object).where(values.notna(), "").astype(str)
+
+
+def _signatures(keys, ts):
+    """Per issue_key: its updated_ts, or all of them in export order for a key that repeats."""
+    m = pd.DataFrame({"issue_key": keys.to_numpy(dtype=object), "ts": _ts_text(ts).to_numpy()}).dropna(subset=["issue_key"])
+    repeated = m["issue_key"].duplicated(keep=False)
+    sig = m[~repeated].set_index("issue_key")["ts"]
+    if repeated.any():
+        rep = m[repeated].groupby("issue_key", sort=False)["ts"].agg(SIG_SEP.join)
+        sig = pd.concat([sig, rep])
+    return sig
+
+
+def load_manifest(path):
+    if not path.exists():
+        return pd.Series(dtype=object)
+    m = read_table(path)
+    return _signatures(m["issue_key"], m["updated_ts"])
+
+
+def diff_export(in_csv, manifest, min_len, chunksize, engine):
+    """Stream the export; return text-constructed rows of new/changed issues, their status, the new manifest.
+
+    An issue is new/changed when its updated_ts signature differs from the manifest's; a key that
+    repeats is compared on all its updated_ts values, and every export row of a new/changed issue
+    is in the delta. Keyless rows are always in the delta (their old rows are always dropped).
+    """
+    build_text = load_stage("02_text_construction").build_text
+    delta_parts = []
+    manifest_parts = []
+    n_rows = 0
+    template = None
+    for chunk in iter_export_chunks(in_csv, chunksize=chunksize, engine=engine):
+        if template is None:
+            template = chunk.head(0).assign(_status=pd.Series(dtype=str), _pos=pd.Series(dtype="int64"))
+        chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+        n_rows += len(chunk)
+        manifest_parts.append(chunk[["issue_key", "updated_ts"]])
+        # Row-level pre-filter: a row whose text equals the manifest signature is unchanged (a
+        # repeated key's signature never equals a single value, so its rows are always taken here)
+        candidate = chunk["issue_key"].map(manifest).fillna(SIG_SEP).to_numpy() != _ts_text(chunk["updated_ts"]).to_numpy()
+        if candidate.any():
+            delta_parts.append(chunk[candidate].assign(_pos=chunk.index[candidate]))
+
+    new_manifest = pd.concat(manifest_parts, ignore_index=True)
+    new_sig = _signatures(new_manifest["issue_key"], new_manifest["updated_ts"])
+    dirty = new_sig.index[new_sig.to_numpy() != new_sig.index.map(manifest).fillna(SIG_SEP).to_numpy()]
+    removed = sorted(set(manifest.index) - set(new_sig.index))
+
+    delta = pd.concat(delta_parts, ignore_index=True) if delta_parts else template.drop(columns=["_status"])
+    in_delta = delta["issue_key"].isin(dirty) | delta["issue_key"].isna()
+    delta = delta[in_delta]
+    # Rows of a dirty key the pre-filter passed over (the key became repeated): one more pass for them
+    missing = new_manifest.index[new_manifest["issue_key"].isin(dirty) & ~new_manifest.index.isin(delta["_pos"])]
+    if len(missing):
+        extra, start = [], 0
+        for chunk in iter_export_chunks(in_csv, chunksize=chunksize, engine=engine):
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            take = chunk.index.isin(missing)
+            if take.any():
+                extra.append(chunk[take].assign(_pos=chunk.index[take]))
+        delta = pd.concat([delta, *extra], ignore_index=True).sort_values("_pos", kind="mergesort")
+
+    if len(delta):
+        delta = build_text(delta.assign(_status=np.where(delta["issue_key"].isin(manifest.index), "changed", "new")))
+    else:
+        delta = build_text(template)
+    delta = delta.drop(columns=["_pos"]).reset_index(drop=True)
+    kept = delta[delta["text_len"] >= min_len]
+    return kept, delta, removed, new_manifest, n_rows
+
+
+def patch_baseline(baseline, delta_kept, drop_keys):
+    """Remove drop_keys from the rank-ordered baseline and insert delta rows at their sorted position."""
+    stage03 = load_stage("03_priority_only_baseline")
+    if "issue_key" not in baseline.columns:
+        baseline = pd.DataFrame(columns=["rank_priority_only"] + stage03.KEEP_COLS[1:])
+    cols = [c for c in baseline.columns if c != "rank_priority_only"]
+    # Keyless rows cannot be matched to the export, so they always come from the delta
+    base = baseline[~(baseline["issue_key"].isin(drop_keys) | baseline["issue_key"].isna())].reset_index(drop=True)
+    base = stage03.add_sort_keys(base)
+
+    ins = stage03.add_sort_keys(delta_kept.copy())
+    ins = ins.sort_values(by=SORT_BY, ascending=[True, True, True], kind="mergesort").reset_index(drop=True)
+
+    # Positions in the (still sorted) remaining baseline; O(d log n) instead of a full re-sort
+    view = _SortKeyView(base)
+    positions = [bisect_left(view, (o, t, k)) for o, t, k in zip(ins["priority_ordinal"], ins["created_ts_num"], ins["issue_key"])]
+    order = np.insert(np.arange(len(base)), positions, np.arange(len(base), len(base) + len(ins)))
+
+    combined = pd.concat([base[cols], ins[cols]], ignore_index=True).iloc[order].reset_index(drop=True)
+    combined.insert(0, "rank_priority_only", np.arange(1, len(combined) + 1))
+    return combined
+
+
+def run(cmd):
+    print("RUN:", " ".join(cmd))
+    subprocess.check_call(cmd)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Incremental 01→07 run: only new/changed issues are reprocessed.")
+    ap.add_argument("--in", dest="in_csv", required=True, help="New Jira export (same format as 01/02 --in)")
+    ap.add_argument("--state_dir", required=True, help="Directory holding manifest, processed table, baseline, scores")
+    ap.add_argument("--gate_cfg", required=True)
+    ap.add_argument("--ks", default="50,100,250,500")
+    ap.add_argument("--min_len", type=int, default=30)
+    ap.add_argument("--format", default="csv", choices=["csv", "parquet", "arrow"], help="State table format")
+    ap.add_argument("--skip_scoring", action="store_true", help="Do not run 06; gate with the scores already in state")
+    ap.add_argument("--full_rescore", action="store_true", help="Score the whole Top-K scope, not only the delta")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    ap.add_argument("--engine", default="c", choices=["c", "python"])
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    state = Path(args.state_dir)
+    state.mkdir(parents=True, exist_ok=True)
+    ext = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}[args.format]
+    manifest_path = state / f"manifest{ext}"
+    processed_path = state / f"processed{ext}"
+    baseline_path = state / f"priority_only_baseline{ext}"
+    scores_path = state / "prism_scores.csv"
+    ks = [int(x) for x in args.ks.split(",") if x.strip()]
+    max_k = max(ks)
+
+    # 1) Diff the export against the manifest (text construction only for the delta)
+    manifest = load_manifest(manifest_path)
+    delta_kept, delta, removed, new_manifest, n_rows = diff_export(
+        args.in_csv, manifest, args.min_len, args.chunksize, args.engine
+    )
+    changed_keys = set(delta.loc[delta["_status"] == "changed", "issue_key"])
+    # Every delta key is dropped before its rows are inserted, so patching is idempotent
+    drop_keys = set(delta["issue_key"].dropna()) | set(removed)
+    delta_kept = delta_kept.drop(columns=["_status"])
+
+    # State tables go to .tmp files and replace the committed ones only once 07 has succeeded
+    # (manifest last), so a failed run leaves the state as it was and is simply retried
+    staged = []
+
+    def stage(df, path):
+        tmp = path.with_name(path.stem + ".tmp" + path.suffix)
+        write_table(df, tmp)
+        staged.append((tmp, path))
+        return tmp
+
+    # 2) Patch the processed table (02 output)
+    if processed_path.exists():
+        processed = read_table(processed_path)
+        processed = processed[~(processed["issue_key"].isin(drop_keys) | processed["issue_key"].isna())]
+        processed = pd.concat([processed, delta_kept[processed.columns]], ignore_index=True)
+    else:
+        processed = delta_kept
+    stage(processed, processed_path)
+
+    # 3) Patch the priority-only baseline (03 output)
+    baseline = read_table(baseline_path) if baseline_path.exists() else pd.DataFrame()
+    baseline = patch_baseline(baseline, delta_kept, drop_keys)
+    baseline_tmp = stage(baseline, baseline_path)
+
+    # 4) PRISM scoring for the Top-K scope rows that are new, changed or not scored yet
+    scope = baseline.head(max_k)
+    scores = read_table(scores_path) if scores_path.exists() else pd.DataFrame(columns=["issue_key", "C", "S", "V"])
+    delta_keys = set(delta_kept["issue_key"])
+    if args.full_rescore:
+        to_score = scope
+    else:
+        to_score = scope[scope["issue_key"].isin(delta_keys) | ~scope["issue_key"].isin(scores["issue_key"])]
+    rescored = 0
+    if len(to_score) and not args.skip_scoring:
+        prism_in = state / "prism_delta" / "prism_input.csv"
+        delta_scores_path = state / "prism_delta" / "prism_scores_delta.csv"
+        prism_in.parent.mkdir(parents=True, exist_ok=True)
+        write_table(load_stage("06a_prepare_airflow_for_prism").prepare_for_prism(to_score), prism_in)
+        run([sys.executable, str(SCRIPTS / "06_run_prism_scoring_airflow.py"),
+             "--input", str(prism_in), "--outdir", str(state / "prism_delta" / "tmp"),
+             "--final_out", str(delta_scores_path)])
+        new_scores = read_table(delta_scores_path)
+        scores = scores[~scores["issue_key"].isin(new_scores["issue_key"])]
+        scores = pd.concat([scores, new_scores], ignore_index=True)
+        rescored = len(new_scores)
+    # Score scope = current Top-K (V2 quantiles are taken over this scope)
+    scores = scores[scores["issue_key"].isin(scope["issue_key"])]
+    scores_tmp = stage(scores, scores_path)
+
+    # 5) Gate the patched baseline (07 is O(max K))
+    run([sys.executable, str(SCRIPTS / "07_apply_readiness_gate.py"),
+         "--baseline_csv", str(baseline_tmp), "--scores_csv", str(scores_tmp),
+         "--out_dir", str(state / "gated"), "--ks", args.ks, "--gate_cfg", args.gate_cfg])
+
+    # 6) Commit the state tables, the manifest last
+    stage(new_manifest, manifest_path)
+    for tmp, path in staged:
+        tmp.replace(path)
+
+    report = {
+        "rows_in_export": int(n_rows),
+        "new": int((delta["_status"] == "new").sum()),
+        "changed": int(len(changed_keys)),
+        "removed": int(len(removed)),
+        "unchanged": int(n_rows - len(delta)),
+        "delta_kept_after_min_len": int(len(delta_kept)),
+        "baseline_rows": int(len(baseline)),
+        "rescored": int(rescored),
+        "seconds": round(time.perf_counter() - t0, 3),
+    }
+    (state / "incremental_report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    print("OK")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
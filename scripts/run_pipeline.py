@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+In-process 01 → 07 run (Paper 2): one process, DataFrames handed from stage to stage.
+
+- The export is streamed once: 01's SchemaReport and 02's TextPass see the same chunks
+- 03 ranks the kept rows in memory; the Top-K sets (04) are prefixes of the ranked table
+- 07 gates the max-K prefix of the in-memory baseline (07's gate_prefix / write_gated)
+- PRISM scoring stays external: --scores_csv is used as given, otherwise the max-K prefix goes
+  through 06a in memory and 06 runs as a subprocess (its scorers are separate programs anyway)
+- Stage tables (processed, baseline, Top-K sets) are optional artifacts (--artifacts); they are
+  written on a background thread while later stages compute (--sync_writes: inline).
+  Reports and gated sets are always written
+- Same file names as run_batch_projects and the same contents as chaining the stage scripts
+- --text_store: texts go to a memory-mapped store as the export is read; ranking and gating frames
+  carry text_ref, and only the PRISM input and the gated sets resolve text
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from issue_index import KeyCodes
+from jira_export import DEFAULT_CHUNKSIZE, SchemaReport, iter_export_chunks
+from pipeline_stages import SCRIPTS, load_stage
+from quantile_sketch import score_sketches
+from readiness_gate import load_gate_cfg, parse_ks
+from table_io import concat_compact, read_table, to_compact, write_table
+from text_store import TEXT_REF, TextStore, TextStoreWriter, resolve_text, text_columns
+
+SUFFIX = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+PREVIEW_COLS = ["issue_key", "project", "created_ts", "updated_ts", "issue_type", "status", "priority", "summary"]
+
+
+class ArtifactWriter:
+    """Writes tables on one background thread, in submission order (or inline with background=False).
+
+    Frames handed to write() must not be modified afterwards; the stages below only ever derive
+    new frames from them.
+    """
+
+    def __init__(self, background=True):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts") if background else None
+        self._pending = []
+        self.written = []
+
+    def write(self, df, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self._pool is None:
+            write_table(df, path)
+        else:
+            self._pending.append(self._pool.submit(write_table, df, path))
+        self.written.append(path)
+
+    def wait(self):
+        """Block until queued writes are on disk (re-raises the first write error)."""
+        pending, self._pending = self._pending, []
+        for fut in pending:
+            fut.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_json(obj, path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(obj, indent=2), encoding="utf-8")
+
+
+def load_and_text(in_csv, min_len, chunksize, engine, store_out=None):
+    """01 + 02 in one streaming pass: (schema report, preview, processed table, 02 report).
+
+    With `store_out` (a TextStoreWriter) kept texts go to the store and the table holds text_ref.
+    """
+    schema = SchemaReport()
+    text_pass = load_stage("02_text_construction").TextPass(min_len)
+    preview_parts, preview_rows, kept = [], 0, []
+    for chunk in iter_export_chunks(in_csv, chunksize=chunksize, engine=engine):
+        schema.update(chunk)
+        if preview_rows < 50:
+            preview_parts.append(chunk[PREVIEW_COLS].head(50 - preview_rows))
+            preview_rows += len(preview_parts[-1])
+        df_kept = text_pass.process(chunk)
+        if store_out is not None:
+            refs = store_out.write(df_kept["issue_key"], df_kept["text"].tolist())
+            df_kept = df_kept.assign(text=refs).rename(columns={"text": TEXT_REF})
+        # Kept rows are held in the compact schema (categoricals, int64 timestamps)
+        kept.append(to_compact(df_kept))
+    processed = concat_compact(kept)
+    return schema.to_dict(), pd.concat(preview_parts, ignore_index=True), processed, text_pass.report()
+
+
+def score(topk, out_dir, workers, text_store=None):
+    """06a in memory, 06 as a subprocess; returns the merged scores path."""
+    prism_in = out_dir / f"for_prism_top{len(topk)}.csv"
+    scores = out_dir / "prism_scores.csv"
+    if text_store is not None:
+        topk = resolve_text(topk, text_store)
+    # PRISM scorers read CSV, so the 06 input is written whatever --artifacts says
+    write_table(load_stage("06a_prepare_airflow_for_prism").prepare_for_prism(topk), prism_in)
+    cmd = [sys.executable, str(SCRIPTS / "06_run_prism_scoring_airflow.py"), "--input", str(prism_in),
+           "--outdir", str(out_dir / "prism_scores_tmp"), "--final_out", str(scores), "--workers", str(workers)]
+    print("RUN:", " ".join(cmd))
+    subprocess.check_call(cmd)
+    return scores
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run 01 → 07 in one process, passing DataFrames between stages.")
+    ap.add_argument("--in", dest="in_csv", required=True, help="Jira export (same format as 01/02 --in)")
+    ap.add_argument("--out_dir", required=True)
+    ap.add_argument("--gate_cfg", required=True)
+    ap.add_argument("--ks", default="50,100,250,500", help="Comma-separated K values or start:stop:step ranges")
+    ap.add_argument("--min_len", type=int, default=30)
+    ap.add_argument("--scores_csv", default=None, help="Existing issue_key,C,S,V scores (skips 06a/06)")
+    ap.add_argument("--skip_scoring", action="store_true", help="Gate without PRISM scores (all missing_scores)")
+    ap.add_argument("--scorer_workers", type=int, default=3, help="06 --workers")
+    ap.add_argument("--quantiles", default="exact", choices=["exact", "sketch"], help="07 --quantiles")
+    ap.add_argument("--artifacts", default="all", choices=["all", "reports"],
+                    help="all: also write the stage tables (processed, baseline, Top-K sets); reports: only reports + gated sets")
+    ap.add_argument("--format", default="csv", choices=sorted(SUFFIX), help="Format of stage tables and gated sets")
+    ap.add_argument("--sync_writes", action="store_true", help="Write stage tables inline instead of on a background thread")
+    ap.add_argument("--text_store", default=None,
+                    help="Keep texts in this store (text_ref in stage tables); only PRISM input and gated sets resolve them")
+    ap.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    ap.add_argument("--engine", default="c", choices=["c", "python"])
+    args = ap.parse_args()
+
+    out_dir = Path(args.out_dir)
+    logs = out_dir / "logs"
+    logs.mkdir(parents=True, exist_ok=True)
+    ext = SUFFIX[args.format]
+    ks = parse_ks(args.ks)
+    max_k = max(ks)
+    cfg = load_gate_cfg(args.gate_cfg)
+    artifacts = args.artifacts == "all"
+    seconds = {}
+    t_start = t = time.perf_counter()
+
+    def lap(name):
+        nonlocal t
+        now = time.perf_counter()
+        seconds[name] = round(now - t, 3)
+        t = now
+
+    with ArtifactWriter(background=not args.sync_writes) as writer:
+        # 01 + 02
+        store_out = TextStoreWriter(args.text_store) if args.text_store else None
+        schema_report, preview, processed, text_report = load_and_text(
+            args.in_csv, args.min_len, args.chunksize, args.engine, store_out)
+        text_store = None
+        if store_out is not None:
+            store_out.close()
+            text_store = TextStore(args.text_store)
+        write_json(schema_report, logs / "01_schema_report.json")
+        preview.to_csv(logs / "01_preview_sample.csv", index=False)
+        write_json(text_report, logs / "02_text_report.json")
+        if artifacts:
+            writer.write(processed, out_dir / f"processed{ext}")
+        lap("01_02_load_text")
+
+        # 03 (on its own copy of the columns it needs, so the queued processed table is untouched)
+        stage03 = load_stage("03_priority_only_baseline")
+        ranked, rank_report = stage03.rank_baseline(processed[text_columns(stage03.IN_COLS, processed.columns)])
+        del processed
+        baseline = ranked[text_columns(stage03.KEEP_COLS, ranked.columns)]
+        write_json(rank_report, logs / "03_priority_only_report.json")
+        if artifacts:
+            writer.write(baseline, out_dir / f"priority_only_baseline{ext}")
+        lap("03_rank")
+
+        # 04
+        if max_k > len(baseline):
+            raise ValueError(f"Requested K={max_k} but dataset has only {len(baseline)} rows.")
+        if artifacts:
+            for k in ks:
+                writer.write(baseline.head(k), out_dir / "topk" / f"baseline_topk_{k}{ext}")
+        lap("04_topk")
+
+        # 06a + 06
+        if args.scores_csv:
+            scores_path = Path(args.scores_csv)
+        elif args.skip_scoring:
+            scores_path = out_dir / "prism_scores.csv"
+            scores_path.write_text("issue_key,C,S,V\n", encoding="utf-8")
+        else:
+            scores_path = score(baseline.head(max_k), out_dir, args.scorer_workers, text_store)
+        lap("06_scoring")
+
+        # 07
+        stage07 = load_stage("07_apply_readiness_gate")
+        scores = read_table(scores_path)
+        sketches = None
+        if cfg.get("rule") == "LOCKED_GATE_V2" and args.quantiles == "sketch":
+            sketches = score_sketches(scores_path, args.chunksize)
+        score_codes = KeyCodes.from_keys(scores["issue_key"])
+        gated = stage07.gate_prefix(baseline, scores, cfg, max_k, sketches, score_codes=score_codes)
+        gate_dir = out_dir / "gated"
+        gate_dir.mkdir(parents=True, exist_ok=True)
+        report_all = stage07.write_gated(gate_dir, gated, len(baseline), ks, args.format, write=writer.write,
+                                         text_store=text_store)
+        lap("07_gate")
+    lap("artifact_wait")
+    seconds["total"] = round(time.perf_counter() - t_start, 3)
+
+    report = {
+        "rows": schema_report["rows"],
+        "rows_after_min_len": text_report["rows_after"],
+        "ks": ks,
+        "gate_rule": report_all["gate_rule"],
+        "scores_csv": str(scores_path),
+        "artifacts": [str(p) for p in writer.written],
+        "seconds": seconds,
+    }
+    write_json(report, logs / "run_pipeline_report.json")
+
+    print("OK")
+    print(json.dumps(seconds, indent=2))
+    print(f"Wrote: {logs / 'run_pipeline_report.json'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Opt-in stage instrumentation for the numbered pipeline scripts (off unless PIPELINE_METRICS is set).
+
+- PIPELINE_METRICS=1 appends one JSON line per stage run to outputs/logs/stage_metrics.jsonl
+  (PIPELINE_METRICS=<path.jsonl> writes there instead): wall time, time per phase
+  (read / compute / write), row counts, rows/s, peak RSS and exit status
+- PIPELINE_PROFILE=<dir> also dumps a cProfile of the stage to <dir>/<stage>.prof
+  (pstats format: `python -m pstats`, snakeviz, gprof2dot)
+- run_measured: wall time and peak RSS of one child process (06 scorers, bench_pipeline stages)
+
+Usage in a stage: decorate main() with @instrument, wrap hot spots in `with phase("read"):`,
+stream chunks through timed(iterable, "read") and report sizes with count_rows(rows_in=n).
+When disabled these are no-ops.
+"""
+
+import cProfile
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_JSONL = ROOT / "outputs" / "logs" / "stage_metrics.jsonl"
+
+_ACTIVE = None
+
+
+def _maxrss_mb(rss):
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round((rss if sys.platform == "darwin" else rss * 1024) / 2**20, 1)
+
+
+def peak_rss_mb():
+    return _maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def run_measured(cmd, **popen_kwargs):
+    """Run `cmd` to completion; returns wall time and the child's own peak RSS (raises if it fails)."""
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, **popen_kwargs)
+    # wait4 reports the rusage of this child alone (not of every child this process has reaped)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    return {"seconds": round(time.perf_counter() - t0, 3), "peak_rss_mb": _maxrss_mb(usage.ru_maxrss)}
+
+
+class StageMetrics:
+    def __init__(self, stage):
+        self.stage = stage
+        self.phases = {}
+        self.rows = {}
+        self.t0 = time.perf_counter()
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            p = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+            p["seconds"] += time.perf_counter() - t0
+            p["calls"] += 1
+
+    def timed(self, iterable, name):
+        """Charge the time spent producing each item (e.g. parsing a chunk) to `name`."""
+        it = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def count_rows(self, **counts):
+        for k, v in counts.items():
+            self.rows[k] = self.rows.get(k, 0) + int(v)
+
+    def record(self, status):
+        seconds = time.perf_counter() - self.t0
+        phases = {k: {"seconds": round(v["seconds"], 4), "calls": v["calls"]} for k, v in self.phases.items()}
+        main_rows = self.rows.get("rows_in", next(iter(self.rows.values()), None))
+        return {
+            "stage": self.stage,
+            "started": self.started,
+            "status": status,
+            "seconds": round(seconds, 4),
+            "phases": phases,
+            "other_seconds": round(seconds - sum(v["seconds"] for v in self.phases.values()), 4),
+            "rows": self.rows,
+            "rows_per_sec": round(main_rows / seconds, 1) if main_rows and seconds else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "pid": os.getpid(),
+            "argv": sys.argv[1:],
+        }
+
+
+def _jsonl_path():
+    value = os.environ.get("PIPELINE_METRICS", "")
+    return DEFAULT_JSONL if value.lower() in ("1", "true", "yes") else Path(value)
+
+
+def instrument(main):
+    """Decorator for a stage's main(); the stage name is the script file name."""
+    # From the code object: stages imported via pipeline_stages.load_stage are not in sys.modules
+    stage = Path(main.__code__.co_filename).stem
+
+    @functools.wraps(main)
+    def wrapper(*args, **kwargs):
+        global _ACTIVE
+        profile_dir = os.environ.get("PIPELINE_PROFILE")
+        if not os.environ.get("PIPELINE_METRICS") and not profile_dir:
+            return main(*args, **kwargs)
+
+        metrics = StageMetrics(stage)
+        profiler = cProfile.Profile() if profile_dir else None
+        prev, _ACTIVE = _ACTIVE, metrics
+        status = "ok"
+        try:
+            if profiler is not None:
+                profiler.enable()
+            return main(*args, **kwargs)
+        except SystemExit as e:
+            status = "ok" if e.code in (None, 0) else f"exit:{e.code}"
+            raise
+        except BaseException as e:
+            status = f"error:{type(e).__name__}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                Path(profile_dir).mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(Path(profile_dir) / f"{stage}.prof"))
+            _ACTIVE = prev
+            if os.environ.get("PIPELINE_METRICS"):
+                path = _jsonl_path()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(metrics.record(status)) + "\n")
+
+    return wrapper
+
+
+def phase(name):
+    return _ACTIVE.phase(name) if _ACTIVE is not None else nullcontext()
+
+
+def timed(iterable, name):
+    return _ACTIVE.timed(iterable, name) if _ACTIVE is not None else iterable
+
+
+def count_rows(**counts):
+    if _ACTIVE is not None:
+        _ACTIVE.count_rows(**counts)
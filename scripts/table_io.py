@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Shared table I/O for pipeline intermediates (Paper 2).
+
+The format is picked from the file suffix:
+  - .parquet : typed columnar file (compressed)
+  - .arrow / .feather : Arrow IPC file, memory-mapped on read (string columns are zero-copy)
+  - anything else : legacy CSV, read with dtype=str exactly as before
+
+Columnar formats keep numeric columns (timestamps, ordinals, ranks, lengths) as int64,
+so they no longer round-trip through strings between stages. pyarrow is only needed
+when a columnar path is actually used.
+
+read_compact loads a table into a compact in-memory schema (categorical project/type/status/
+priority, int64 timestamps and ordinals, Arrow-string keys); values written back are unchanged.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+
+PARQUET_SUFFIXES = {".parquet", ".pq"}
+ARROW_SUFFIXES = {".arrow", ".feather", ".ipc"}
+
+# Columns stored as nullable int64 in columnar intermediates
+INT_COLS = ["created_ts", "updated_ts", "text_len", "priority_ordinal", "rank_priority_only"]
+
+# In-memory compact schema (read_compact): low-cardinality columns as categoricals,
+# per-row keys as Arrow strings (one buffer instead of a Python object per row)
+CATEGORY_COLS = ["project", "issue_type", "status", "priority"]
+KEY_COLS = ["issue_key", "req_id"]
+
+
+def table_format(path):
+    suffix = Path(path).suffix.lower()
+    if suffix in PARQUET_SUFFIXES:
+        return "parquet"
+    if suffix in ARROW_SUFFIXES:
+        return "arrow"
+    return "csv"
+
+
+def _pa():
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("pyarrow is required for .parquet/.arrow intermediates (pip install pyarrow)") from e
+    return pa
+
+
+def _string_mapper(pa):
+    # Keep Arrow string buffers as-is (no per-row Python objects); on a memory-mapped file this is zero-copy.
+    def mapper(t):
+        if pa.types.is_string(t) or pa.types.is_large_string(t):
+            return pd.ArrowDtype(t)
+        return None
+    return mapper
+
+
+def _read_arrow(path, columns=None):
+    pa = _pa()
+    import pyarrow.ipc as ipc
+
+    source = pa.memory_map(str(path), "r")
+    table = ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(list(columns))
+    return table
+
+
+def _read_parquet(path, columns=None):
+    _pa()
+    import pyarrow.parquet as pq
+
+    return pq.read_table(str(path), columns=list(columns) if columns is not None else None, memory_map=True)
+
+
+def read_arrow_table(path, columns=None):
+    """Read a columnar intermediate as a pyarrow.Table (no pandas conversion)."""
+    fmt = table_format(path)
+    if fmt == "arrow":
+        return _read_arrow(path, columns)
+    if fmt == "parquet":
+        return _read_parquet(path, columns)
+    raise ValueError(f"Not a columnar file: {path}")
+
+
+def read_table(path, columns=None):
+    """Read an intermediate table, optionally only `columns`."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, dtype=str, usecols=list(columns) if columns is not None else None)
+    return _to_pandas(read_arrow_table(path, columns), fmt)
+
+
+def _to_pandas(table, fmt):
+    if fmt == "arrow":
+        return table.to_pandas(types_mapper=_string_mapper(_pa()))
+    return table.to_pandas()
+
+
+def iter_table_chunks(path, chunksize, columns=None):
+    """Yield an intermediate table as DataFrames of at most `chunksize` rows."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        reader = pd.read_csv(path, dtype=str, chunksize=chunksize, usecols=list(columns) if columns is not None else None)
+        with reader:
+            yield from reader
+        return
+    if fmt == "parquet":
+        _pa()
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(str(path), memory_map=True)
+        for batch in pf.iter_batches(batch_size=chunksize, columns=list(columns) if columns is not None else None):
+            yield batch.to_pandas()
+        return
+    table = read_arrow_table(path, columns)
+    for start in range(0, table.num_rows, chunksize):
+        yield _to_pandas(table.slice(start, chunksize), fmt)
+
+
+def read_columns(path):
+    """Column names from the header/schema only (no data rows are parsed)."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        return list(pd.read_csv(path, dtype=str, nrows=0).columns)
+    _pa()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(str(path)).names)
+    import pyarrow.ipc as ipc
+
+    with ipc.open_file(str(path)) as reader:
+        return list(reader.schema.names)
+
+
+def read_head(path, n, columns=None):
+    """First `n` rows of a table (CSV stops parsing after n rows)."""
+    fmt = table_format(path)
+    if fmt == "csv":
+        return pd.read_csv(path, dtype=str, nrows=n, usecols=list(columns) if columns is not None else None)
+    return _to_pandas(read_arrow_table(path, columns).slice(0, n), fmt)
+
+
+def read_rows(path, positions, columns=None):
+    """Rows at 0-based `positions` (in that order). CSV parsing stops after the last requested row."""
+    positions = [int(p) for p in positions]
+    fmt = table_format(path)
+    if fmt == "csv":
+        nrows = (max(positions) + 1) if positions else 0
+        df = pd.read_csv(path, dtype=str, nrows=nrows, usecols=list(columns) if columns is not None else None)
+        return df.iloc[positions].reset_index(drop=True)
+    return _to_pandas(read_arrow_table(path, columns).take(positions), fmt)
+
+
+def to_typed(df):
+    """Cast INT_COLS to nullable int64 for columnar storage; a column holding any value that is not
+    an integer (e.g. a date string in created_ts) stays as it was read."""
+    df = df.copy()
+    for col in INT_COLS:
+        if col in df.columns:
+            ints = _int_column(df[col])
+            if ints is not None:
+                df[col] = ints
+    for col in df.columns:
+        # Categoricals (read_compact) are stored as their plain values
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(df[col].cat.categories.dtype)
+    return df
+
+
+def _int_column(values):
+    """Int64 copy of `values`, or None when some value is not an integer written as one."""
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        try:
+            # Floats come from columnar int columns with nulls; fractions raise
+            return values.astype("Int64")
+        except (TypeError, ValueError):
+            return None
+    ints = _exact_ints(values)
+    return None if ints is None else ints.astype("Int64")
+
+
+def _exact_ints(values):
+    """int64 (Int64 if any value is missing) when every value's text round-trips, else None."""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values if values.isna().any() else values.astype("int64")
+    present = values.notna()
+    num = pd.to_numeric(values, errors="coerce")
+    if (num.isna() & present).any():
+        return None
+    try:
+        ints = num.astype("Int64")
+    except (TypeError, ValueError):
+        return None
+    # "0123", "1.0" or "+5" would not be written back as they were read
+    if not (ints[present].astype(str).to_numpy() == values[present].astype(str).to_numpy()).all():
+        return None
+    return ints if ints.isna().any() else ints.astype("int64")
+
+
+def _key_dtype():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        # NaN as the missing value, like dtype=str columns (pandas >= 2.3; the default str in 3.x)
+        return pd.StringDtype("pyarrow", na_value=float("nan"))
+    except TypeError:
+        return pd.StringDtype("pyarrow")
+
+
+def to_compact(df):
+    """Compact in-memory copy: CATEGORY_COLS as categoricals, INT_COLS as int64 where the text
+    round-trips exactly, KEY_COLS as Arrow strings. Written back out, every value is unchanged."""
+    key_dtype = _key_dtype()
+    cols = {}
+    for col in df.columns:
+        s = df[col]
+        if col in CATEGORY_COLS:
+            s = s.astype("category")
+        elif col in INT_COLS:
+            ints = _exact_ints(s)
+            s = s if ints is None else ints
+        elif col in KEY_COLS and key_dtype is not None and s.dtype != key_dtype:
+            s = s.astype(key_dtype)
+        cols[col] = s
+    return pd.DataFrame(cols, index=df.index)
+
+
+def concat_compact(parts):
+    """pd.concat of to_compact chunks that keeps them compact (categories are unioned)."""
+    if len(parts) == 1:
+        return parts[0].reset_index(drop=True)
+    parts = [p.copy(deep=False) for p in parts]
+    for col in parts[0].columns:
+        dtypes = [p[col].dtype for p in parts]
+        if all(isinstance(d, pd.CategoricalDtype) for d in dtypes):
+            cats = pd.Index(pd.unique(pd.concat([pd.Series(d.categories) for d in dtypes], ignore_index=True)))
+            for p in parts:
+                p[col] = p[col].cat.set_categories(cats)
+        elif col in INT_COLS and not all(pd.api.types.is_integer_dtype(d) for d in dtypes):
+            # Some chunk kept the text: the whole column does (its ints print as they were read)
+            for p in parts:
+                if pd.api.types.is_integer_dtype(p[col].dtype):
+                    p[col] = p[col].astype(object).map(str, na_action="ignore")
+    return pd.concat(parts, ignore_index=True)
+
+
+def read_compact(path, columns=None, chunksize=100_000):
+    """read_table into the compact schema, converting chunk by chunk (no full string copy in memory)."""
+    return concat_compact([to_compact(c) for c in iter_table_chunks(path, chunksize, columns=columns)]
+                          or [to_compact(read_table(path, columns))])
+
+
+def memory_report(df):
+    """Deep bytes (string payloads included) and dtype per column, plus the total."""
+    usage = df.memory_usage(deep=True, index=False)
+    return {
+        "columns": {c: {"dtype": str(df[c].dtype), "bytes": int(usage[c])} for c in df.columns},
+        "total_bytes": int(usage.sum()),
+    }
+
+
+def _to_arrow(df, schema=None):
+    pa = _pa()
+    if schema is not None:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # All-missing columns infer as null; store them as strings so later chunks can fill them.
+    fields = [pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+def write_table(df, path, also_csv=False):
+    """Write `df` in the format implied by `path`; `also_csv` adds a sibling .csv export."""
+    with TableWriter(path, also_csv=also_csv) as w:
+        w.write(df)
+
+
+class TableWriter:
+    """Append DataFrame chunks to one output file (CSV, Parquet or Arrow IPC).
+
+    Columnar files: an INT_COLS column is int64 until a chunk has a value that is not an integer;
+    from then on it is text (what was written so far is re-typed once). Closed without any chunk,
+    the file is still written, empty, with `columns`.
+    """
+
+    def __init__(self, path, also_csv=False, columns=None):
+        self.path = Path(path)
+        self.fmt = table_format(path)
+        self.csv_path = self.path.with_suffix(".csv") if (also_csv and self.fmt != "csv") else None
+        self.columns = list(columns) if columns is not None else []
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._out = self.path
+        self._retypes = 0
+        self._started = False
+        self._csv_started = False
+
+    def _write_csv(self, df, path):
+        df.to_csv(path, index=False, mode="a" if self._csv_started else "w", header=not self._csv_started)
+
+    def write(self, df):
+        self.rows += len(df)
+        self._started = True
+        if self.fmt == "csv":
+            self._write_csv(df, self.path)
+            self._csv_started = True
+            return
+        if self.csv_path is not None:
+            self._write_csv(df, self.csv_path)
+            self._csv_started = True
+
+        table = self._arrow_chunk(df)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = self._open(self._out)
+        self._writer.write_table(table)
+
+    def _open(self, path):
+        if self.fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            return pq.ParquetWriter(str(path), self._schema)
+        import pyarrow.ipc as ipc
+
+        return ipc.new_file(str(path), self._schema)
+
+    def _arrow_chunk(self, df):
+        pa = _pa()
+        typed = to_typed(df)
+        if self._schema is None:
+            return _to_arrow(typed)
+        is_text = lambda t: pa.types.is_string(t) or pa.types.is_large_string(t)  # noqa: E731
+        to_text = [f.name for f in self._schema if f.name in INT_COLS and pa.types.is_integer(f.type)
+                   and not pd.api.types.is_integer_dtype(typed[f.name].dtype)]
+        if to_text:
+            self._retype_as_text(to_text)
+        for f in self._schema:
+            if f.name in INT_COLS and is_text(f.type) and pd.api.types.is_integer_dtype(typed[f.name].dtype):
+                # The file keeps this column as text: integers go in as they were read
+                src = df[f.name]
+                typed[f.name] = src.astype("string") if pd.api.types.is_numeric_dtype(src.dtype) else src
+        return _to_arrow(typed, self._schema)
+
+    def _retype_as_text(self, cols):
+        """Rewrite what was written so far with `cols` as text (a later chunk is not all integers)."""
+        pa = _pa()
+        self._writer.close()
+        written = read_arrow_table(self._out)
+        self._schema = pa.schema([pa.field(f.name, pa.string()) if f.name in cols else f for f in written.schema])
+        self._retypes += 1
+        out = self.path.with_name(f"{self.path.name}.retype{self._retypes}")
+        self._writer = self._open(out)
+        self._writer.write_table(written.cast(self._schema))
+        del written
+        if self._out != self.path:
+            self._out.unlink()
+        self._out = out
+
+    def close(self):
+        if not self._started:
+            # Nothing was written: still leave a (header-only / empty) file behind
+            if self.fmt == "csv" and not self.columns:
+                self.path.write_text("", encoding="utf-8")
+            else:
+                self.write(pd.DataFrame({c: pd.Series(dtype=object) for c in self.columns}))
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._out != self.path:
+                self._out.replace(self.path)
+                self._out = self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped text store, so ranking and gating tables carry a reference instead of the text (Paper 2).
+
+Layout of one store directory:
+  text.bin   : UTF-8 texts appended back to back, read back memory-mapped
+  index.npz  : per entry issue_key, offset and length in bytes (length -1 = missing text)
+
+- 02 --text_store writes the texts of kept rows here; its processed table gets a text_ref column
+  (entry number) in place of text, which 03/04/07 carry through like any other key column
+- Text is resolved only where an output needs it (06a's PRISM input, 07 gated sets with
+  --text_store, 02b shingles): resolve_text puts text back where text_ref was, so the tables
+  are the same as without a store
+- Entries are also indexed by issue_key (lookup); a key that repeats resolves to its first entry
+"""
+
+import mmap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TEXT_REF = "text_ref"
+
+
+class TextStoreWriter:
+    """Append texts to a new store, swapped in on close.
+
+    Texts go to text.tmp.bin until close writes the index and replaces text.bin/index.npz, so an
+    existing store stays intact (and a crashed writer leaves only the .tmp files behind).
+    """
+
+    def __init__(self, root):
+        self.dir = Path(root)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._bin = open(self.dir / "text.tmp.bin", "wb")
+        self._keys, self._offsets, self._lengths = [], [], []
+        self._pos = 0
+
+    def __len__(self):
+        return sum(len(k) for k in self._keys)
+
+    def write(self, keys, texts):
+        """Store `texts` (aligned with `keys`); returns their entry numbers."""
+        start = len(self)
+        offsets = np.empty(len(texts), dtype=np.int64)
+        lengths = np.empty(len(texts), dtype=np.int64)
+        blobs = []
+        for i, t in enumerate(texts):
+            offsets[i] = self._pos
+            if isinstance(t, str):
+                b = t.encode("utf-8")
+                blobs.append(b)
+                lengths[i] = len(b)
+                self._pos += len(b)
+            else:
+                lengths[i] = -1
+        self._bin.write(b"".join(blobs))
+        self._keys.append(np.asarray(pd.Series(keys, dtype=object).fillna("").astype(str), dtype=str))
+        self._offsets.append(offsets)
+        self._lengths.append(lengths)
+        return np.arange(start, start + len(texts), dtype=np.int64)
+
+    def close(self):
+        if self._bin.closed:
+            return
+        self._bin.close()
+        cat = lambda parts, dtype: np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)  # noqa: E731
+        tmp = self.dir / "index.tmp.npz"
+        np.savez(tmp, keys=cat(self._keys, str), offsets=cat(self._offsets, np.int64),
+                 lengths=cat(self._lengths, np.int64))
+        # Old index first: a crash between the two swaps leaves no index, never stale offsets
+        (self.dir / "index.npz").unlink(missing_ok=True)
+        (self.dir / "text.tmp.bin").replace(self.dir / "text.bin")
+        tmp.replace(self.dir / "index.npz")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._bin.close()  # leave any existing store as it was
+
+
+class TextStore:
+    def __init__(self, root):
+        self.dir = Path(root)
+        index = self.dir / "index.npz"
+        if not index.exists():
+            raise FileNotFoundError(f"No text store index at {index} (was the writer closed?)")
+        with np.load(index, allow_pickle=False) as z:
+            self.keys = z["keys"]
+            self.offsets = z["offsets"]
+            self.lengths = z["lengths"]
+        self._key_index = None
+        size = (self.dir / "text.bin").stat().st_size
+        with open(self.dir / "text.bin", "rb") as f:
+            # mmap cannot map an empty file
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def get(self, refs):
+        """Texts of entries `refs` (NaN where an entry has no text)."""
+        refs = np.asarray(refs, dtype=np.int64)
+        if len(refs) and (refs.min() < 0 or refs.max() >= len(self)):
+            raise IndexError(f"text_ref out of range for a store of {len(self)} entries")
+        out = []
+        for o, n in zip(self.offsets[refs].tolist(), self.lengths[refs].tolist()):
+            out.append(self._blob[o:o + n].decode("utf-8") if n >= 0 else np.nan)
+        return out
+
+    def lookup(self, keys):
+        """Texts by issue_key (first entry of a repeated key; NaN for keys not in the store)."""
+        if self._key_index is None:
+            # Reversed, so a repeated key maps to its first entry
+            self._key_index = pd.Series(np.arange(len(self))[::-1], index=self.keys[::-1])
+            self._key_index = self._key_index[~self._key_index.index.duplicated(keep="last")]
+        pos = self._key_index.reindex(pd.Index(np.asarray(keys, dtype=object))).to_numpy()
+        hit = ~pd.isna(pos)
+        out = np.full(len(pos), np.nan, dtype=object)
+        if hit.any():
+            out[hit] = self.get(pos[hit].astype(np.int64))
+        return list(out)
+
+
+def resolve_text(df, store, col="text"):
+    """`df` with its text_ref column replaced (same position) by the referenced texts."""
+    if TEXT_REF not in df.columns:
+        return df
+    texts = store.get(pd.to_numeric(df[TEXT_REF], errors="raise").to_numpy(dtype=np.int64))
+    out = df.copy()
+    out[TEXT_REF] = pd.Series(texts, index=df.index, dtype=object)
+    return out.rename(columns={TEXT_REF: col})
+
+
+def text_columns(cols, available):
+    """`cols` with text swapped for text_ref when a table carries references instead of text."""
+    if "text" not in available and TEXT_REF in available:
+        return [TEXT_REF if c == "text" else c for c in cols]
+    return list(cols)
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Streaming table validation for the preflight / audit stages (06b, 06c).
+
+- missing_columns: required columns from the header/schema alone (no data rows are parsed)
+- validate: value checks in one streaming pass over only the columns they need, stopping at the
+  first violation (fail_fast) or after max_rows (sample preflight)
+- Checks: NotNull, Numeric (parseable, optionally within a range), Allowed (e.g. 03's priorities),
+  NotMonotonic (a readiness signal must not just be an ordering; warn=True only reports it)
+"""
+
+import numpy as np
+import pandas as pd
+
+from table_io import iter_table_chunks, read_columns
+
+
+def as_float(values):
+    """float64 array of a column; values that do not parse become NaN."""
+    try:
+        return values.astype("float64").to_numpy(na_value=np.nan)
+    except (TypeError, ValueError):
+        return pd.to_numeric(values, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def missing_columns(path, required):
+    cols = set(read_columns(path))
+    return [c for c in required if c not in cols]
+
+
+def _violation(check, col, mask, values, offset, message):
+    """Violation record for rows where `mask` holds in a chunk starting at row `offset`."""
+    idx = np.flatnonzero(np.asarray(mask))
+    return {
+        "check": check,
+        "column": col,
+        "message": message,
+        "first_row": int(offset + idx[0]),
+        "rows_in_chunk": int(len(idx)),
+        "examples": [None if pd.isna(v) else str(v) for v in pd.Series(values).iloc[idx[:5]]],
+    }
+
+
+class NotNull:
+    def __init__(self, col):
+        self.columns = [col]
+
+    def scan(self, chunk, offset):
+        col = self.columns[0]
+        miss = chunk[col].isna().to_numpy()
+        if miss.any():
+            return _violation("not_null", col, miss, chunk[col], offset, f"{col} has missing values")
+
+    def finish(self):
+        return None
+
+    def summary(self):
+        return {}
+
+
+class Numeric:
+    """Values parse as numbers (missing allowed only if `required` is False) and lie in [lo, hi]."""
+
+    def __init__(self, col, lo=None, hi=None, required=True):
+        self.columns = [col]
+        self.lo, self.hi, self.required = lo, hi, required
+        self.min, self.max = np.inf, -np.inf
+
+    def scan(self, chunk, offset):
+        col = self.columns[0]
+        raw = chunk[col]
+        num = as_float(raw)
+        bad = np.isnan(num) & raw.notna().to_numpy()
+        if bad.any():
+            return _violation("numeric", col, bad, raw, offset, f"{col} has values that are not numeric")
+        if self.required and np.isnan(num).any():
+            return _violation("numeric", col, np.isnan(num), raw, offset, f"{col} has missing values")
+        if (~np.isnan(num)).any():
+            self.min = min(self.min, float(np.nanmin(num)))
+            self.max = max(self.max, float(np.nanmax(num)))
+        out = np.zeros(len(num), dtype=bool)
+        if self.lo is not None:
+            out |= num < self.lo
+        if self.hi is not None:
+            out |= num > self.hi
+        if out.any():
+            return _violation("range", col, out, raw, offset, f"{col} outside [{self.lo}, {self.hi}]")
+
+    def finish(self):
+        return None
+
+    def summary(self):
+        if self.min > self.max:
+            return {}
+        return {"min": self.min, "max": self.max}
+
+
+class Allowed:
+    """Values come from a fixed vocabulary (missing counts as unknown, as in 03)."""
+
+    def __init__(self, col, values):
+        self.columns = [col]
+        self.values = set(values)
+
+    def scan(self, chunk, offset):
+        col = self.columns[0]
+        bad = ~chunk[col].isin(self.values).to_numpy()
+        if bad.any():
+            counts = chunk.loc[bad, col].value_counts(dropna=False).head(10).to_dict()
+            return _violation("allowed", col, bad, chunk[col], offset, f"Unknown {col} values encountered: {counts}")
+
+    def finish(self):
+        return None
+
+    def summary(self):
+        return {}
+
+
+class NotMonotonic:
+    """Judged only at the end: the whole column must not be monotonic (checked chunk by chunk).
+
+    Fewer than 3 rows or a constant column say nothing about ordering and never count as monotonic;
+    warn=True reports a monotonic column as a warning instead of a violation.
+    """
+
+    def __init__(self, col, warn=False):
+        self.columns = [col]
+        self.warn = warn
+        self.inc = self.dec = True
+        self.varies = False
+        self.last = None
+        self.n = 0
+
+    def scan(self, chunk, offset):
+        num = as_float(chunk[self.columns[0]])
+        if not len(num):
+            return None
+        if self.last is not None:
+            num = np.concatenate([[self.last], num])
+        d = np.diff(num)
+        # NaN breaks monotonicity, as in Series.is_monotonic_*
+        self.inc &= bool(np.all(d >= 0)) and not np.isnan(num).any()
+        self.dec &= bool(np.all(d <= 0)) and not np.isnan(num).any()
+        self.varies |= bool((num != num[0]).any())
+        self.last = num[-1]
+        self.n += len(chunk)
+        return None
+
+    def monotonic(self):
+        return self.n > 2 and self.varies and (self.inc or self.dec)
+
+    def finish(self):
+        col = self.columns[0]
+        if self.monotonic():
+            return {"check": "not_monotonic", "column": col, "message": f"{col} is monotonic over the whole file",
+                    "first_row": None, "rows_in_chunk": None, "examples": []}
+        return None
+
+    def summary(self):
+        return {"monotonic": self.monotonic()}
+
+
+def validate(path, checks, chunksize=100_000, fail_fast=True, max_rows=None):
+    """Run `checks` over the table in one streaming pass; returns a report dict."""
+    columns = list(dict.fromkeys(c for chk in checks for c in chk.columns))
+    rows = 0
+    violations = []
+    warnings = []
+    stopped = False
+    for chunk in iter_table_chunks(path, chunksize, columns=columns):
+        if max_rows is not None and rows + len(chunk) > max_rows:
+            # A row past max_rows exists (a file of exactly max_rows rows reads to EOF and is complete)
+            chunk = chunk.iloc[: max_rows - rows]
+            stopped = True
+        if len(chunk):
+            for chk in checks:
+                v = chk.scan(chunk, rows)
+                if v is not None:
+                    violations.append(v)
+        rows += len(chunk)
+        if stopped or (fail_fast and violations):
+            stopped = True
+            break
+    if not stopped:
+        # Whole-file checks only mean something after a complete pass
+        for chk in checks:
+            v = chk.finish()
+            if v is not None:
+                (warnings if getattr(chk, "warn", False) else violations).append(v)
+    return {
+        "rows_scanned": rows,
+        "complete": not stopped,
+        "ok": not violations,
+        "violations": violations,
+        "warnings": warnings,
+        "summary": {f"{type(chk).__name__}:{chk.columns[0]}": chk.summary() for chk in checks if chk.summary()},
+    }
+
+
+def print_report(report):
+    scope = "all rows" if report["complete"] else "stopped early"
+    print(f"Rows scanned: {report['rows_scanned']} ({scope})")
+    for v in report["violations"]:
+        where = f" (first at row {v['first_row']}, e.g. {v['examples']})" if v["first_row"] is not None else ""
+        print(f"FAIL [{v['check']}] {v['message']}{where}")
+    for v in report["warnings"]:
+        print(f"WARN [{v['check']}] {v['message']}")